@@ -0,0 +1,32 @@
+"""Add indexes for invoice/alert filter columns
+
+Revision ID: 3f6c2a9d8b41
+Revises: ed9e1d9b7456
+Create Date: 2026-10-14 09:12:31.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6c2a9d8b41'
+down_revision: Union[str, Sequence[str], None] = 'ed9e1d9b7456'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_invoices_vendor_date', 'invoices', ['vendor_id', 'invoice_date'], unique=False)
+    op.create_index(op.f('ix_invoice_items_invoice_id'), 'invoice_items', ['invoice_id'], unique=False)
+    op.create_index('ix_alerts_invoice_status', 'alerts', ['invoice_id', 'status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_alerts_invoice_status', table_name='alerts')
+    op.drop_index(op.f('ix_invoice_items_invoice_id'), table_name='invoice_items')
+    op.drop_index('ix_invoices_vendor_date', table_name='invoices')
@@ -0,0 +1,50 @@
+"""Add indexed parsed vendor name and invoice number to invoices
+
+Revision ID: 4a8e2c6f1d93
+Revises: d7a3b6c0e512
+Create Date: 2026-10-15 10:18:42.517306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a8e2c6f1d93'
+down_revision: Union[str, Sequence[str], None] = 'd7a3b6c0e512'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('invoices', sa.Column('parsed_vendor_name', sa.String(length=255), nullable=True))
+    op.add_column('invoices', sa.Column('parsed_invoice_number', sa.String(length=100), nullable=True))
+    
+    # Backfill from parsed_data (->> on PostgreSQL, json_extract elsewhere)
+    invoices = sa.table('invoices', sa.column('parsed_data', sa.JSON()),
+                        sa.column('parsed_vendor_name', sa.String()),
+                        sa.column('parsed_invoice_number', sa.String()))
+    op.execute(
+        invoices.update()
+        .where(invoices.c.parsed_data.isnot(None))
+        .values(
+            parsed_vendor_name=sa.func.substr(invoices.c.parsed_data['vendor_name'].as_string(), 1, 255),
+            parsed_invoice_number=sa.func.substr(invoices.c.parsed_data['invoice_number'].as_string(), 1, 100),
+        )
+    )
+    
+    op.create_index('ix_invoices_parsed_vendor_number', 'invoices',
+                    ['parsed_vendor_name', 'parsed_invoice_number'], unique=False)
+    op.create_index('ix_invoices_parsed_vendor_date', 'invoices',
+                    ['parsed_vendor_name', 'invoice_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_invoices_parsed_vendor_date', table_name='invoices')
+    op.drop_index('ix_invoices_parsed_vendor_number', table_name='invoices')
+    op.drop_column('invoices', 'parsed_invoice_number')
+    op.drop_column('invoices', 'parsed_vendor_name')
@@ -0,0 +1,30 @@
+"""Add content_hash to invoices for upload dedupe
+
+Revision ID: 8c1d4e7f2a90
+Revises: 3f6c2a9d8b41
+Create Date: 2026-10-14 11:47:05.162934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1d4e7f2a90'
+down_revision: Union[str, Sequence[str], None] = '3f6c2a9d8b41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('invoices', sa.Column('content_hash', sa.String(length=32), nullable=True))
+    op.create_index(op.f('ix_invoices_content_hash'), 'invoices', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_invoices_content_hash'), table_name='invoices')
+    op.drop_column('invoices', 'content_hash')
@@ -0,0 +1,42 @@
+"""Store invoices.parsed_data as JSONB on PostgreSQL
+
+Revision ID: b5e2f9a1c374
+Revises: 8c1d4e7f2a90
+Create Date: 2026-10-14 13:05:48.730215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e2f9a1c374'
+down_revision: Union[str, Sequence[str], None] = '8c1d4e7f2a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # JSONB is PostgreSQL-only; other backends keep the generic JSON column
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.alter_column('invoices', 'parsed_data',
+               existing_type=sa.JSON(),
+               type_=postgresql.JSONB(astext_type=sa.Text()),
+               existing_nullable=True,
+               postgresql_using='parsed_data::jsonb')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.alter_column('invoices', 'parsed_data',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               type_=sa.JSON(),
+               existing_nullable=True,
+               postgresql_using='parsed_data::json')
@@ -0,0 +1,68 @@
+"""Use timezone-aware server-side timestamps
+
+Revision ID: d7a3b6c0e512
+Revises: b5e2f9a1c374
+Create Date: 2026-10-14 14:22:19.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3b6c0e512'
+down_revision: Union[str, Sequence[str], None] = 'b5e2f9a1c374'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (table, timestamp columns populated on insert)
+TIMESTAMPED_TABLES = [
+    ('vendors', ['created_at', 'updated_at']),
+    ('invoices', ['created_at', 'updated_at']),
+    ('invoice_items', ['created_at']),
+    ('alerts', ['created_at']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, columns in TIMESTAMPED_TABLES:
+        for column in columns:
+            op.execute(f"UPDATE {table} SET {column} = CURRENT_TIMESTAMP WHERE {column} IS NULL")
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                # Existing naive values were written with datetime.utcnow
+                batch_op.alter_column(column,
+                           existing_type=sa.DateTime(),
+                           type_=sa.DateTime(timezone=True),
+                           server_default=sa.func.now(),
+                           nullable=False,
+                           postgresql_using=f"{column} AT TIME ZONE 'UTC'")
+    with op.batch_alter_table('alerts') as batch_op:
+        batch_op.alter_column('resolved_at',
+                   existing_type=sa.DateTime(),
+                   type_=sa.DateTime(timezone=True),
+                   existing_nullable=True,
+                   postgresql_using="resolved_at AT TIME ZONE 'UTC'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('alerts') as batch_op:
+        batch_op.alter_column('resolved_at',
+                   existing_type=sa.DateTime(timezone=True),
+                   type_=sa.DateTime(),
+                   existing_nullable=True,
+                   postgresql_using="resolved_at AT TIME ZONE 'UTC'")
+    for table, columns in reversed(TIMESTAMPED_TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column,
+                           existing_type=sa.DateTime(timezone=True),
+                           type_=sa.DateTime(),
+                           server_default=None,
+                           nullable=True,
+                           postgresql_using=f"{column} AT TIME ZONE 'UTC'")
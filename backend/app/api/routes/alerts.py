@@ -1,25 +1,54 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, status, Depends, Response
+from sqlalchemy.orm import Session, selectinload
 from app.database import get_db
 from app.core.models.invoice import Alert, Invoice
 from app.core.schemas.invoice import AlertResponse
-from typing import List
+from pydantic import TypeAdapter
+from typing import List, Optional
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Listings are built from trusted DB rows with model_construct (no validation)
+# and dumped in one pass by pydantic-core
+ALERT_FIELDS = tuple(AlertResponse.model_fields)
+ALERT_LIST = TypeAdapter(List[AlertResponse])
+
 @router.get("/", response_model=List[AlertResponse])
-def list_alerts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """List all alerts with pagination."""
-    alerts = db.query(Alert).offset(skip).limit(limit).all()
-    return alerts
+def list_alerts(
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """List alerts, newest first, using keyset pagination on the primary key.
+
+    Pass the ``X-Next-Cursor`` response header back as ``after_id`` to fetch the next page.
+    """
+    query = db.query(Alert)
+    if after_id is not None:
+        query = query.filter(Alert.id < after_id)
+    alerts = query.order_by(Alert.id.desc()).limit(limit).all()
+    responses = [
+        AlertResponse.model_construct(**{name: getattr(alert, name) for name in ALERT_FIELDS})
+        for alert in alerts
+    ]
+    headers = {}
+    if len(alerts) == limit:
+        headers[NEXT_CURSOR_HEADER] = str(alerts[-1].id)
+    return Response(ALERT_LIST.dump_json(responses), media_type="application/json", headers=headers)
 
 @router.get("/invoices/{invoice_id}/alerts", response_model=List[AlertResponse])
 def get_invoice_alerts(invoice_id: int, db: Session = Depends(get_db)):
     """Get alerts for a specific invoice."""
-    # Check if invoice exists
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+    # Load the invoice together with its alerts
+    invoice = (
+        db.query(Invoice)
+        .options(selectinload(Invoice.alerts))
+        .filter(Invoice.id == invoice_id)
+        .first()
+    )
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found.")
     
-    alerts = db.query(Alert).filter(Alert.invoice_id == invoice_id).all()
-    return alerts 
\ No newline at end of file
+    return invoice.alerts 
\ No newline at end of file
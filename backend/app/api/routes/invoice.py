@@ -1,141 +1,431 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends, Form
-from sqlalchemy.orm import Session
-from app.database import get_db
+from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends, Form, Response, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session, joinedload, selectinload, load_only
+from app.database import get_db, SessionLocal
 from app.core.models.invoice import Invoice, Vendor, InvoiceItem, Alert
-from app.core.schemas.invoice import InvoiceResponse
+from app.core.schemas.invoice import InvoiceResponse, InvoiceSummaryResponse, VendorSummary, ParseBatchRequest, ParseBatchResult
 from app.config import settings
-from modules.parsing.pipeline import InvoiceParsingPipeline
+from modules.parsing.pipeline import get_pipeline
 import os
 from pathlib import Path
-import shutil
-from typing import List
+import aiofiles
+import aiofiles.os
+import hashlib
+import orjson
+import uuid
+from typing import List, Optional
+from pydantic import TypeAdapter
 import structlog
 from datetime import datetime
 
 logger = structlog.get_logger()
 router = APIRouter(prefix="/invoices", tags=["invoices"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Relationships serialized by InvoiceResponse; loaded up front to avoid N+1 queries
+INVOICE_RESPONSE_OPTIONS = (
+    joinedload(Invoice.vendor),
+    selectinload(Invoice.items),
+    selectinload(Invoice.alerts),
+)
+
+# Columns serialized by InvoiceSummaryResponse; skips the heavy raw_text/parsed_data
+INVOICE_SUMMARY_OPTIONS = (
+    load_only(
+        Invoice.id,
+        Invoice.vendor_id,
+        Invoice.invoice_number,
+        Invoice.invoice_date,
+        Invoice.total,
+        Invoice.status,
+        Invoice.created_at,
+    ),
+    joinedload(Invoice.vendor).load_only(Vendor.id, Vendor.name),
+)
+
+# Listings are built from trusted DB rows with model_construct (no validation)
+# and dumped in one pass by pydantic-core
+INVOICE_SUMMARY_FIELDS = tuple(name for name in InvoiceSummaryResponse.model_fields if name != "vendor")
+INVOICE_SUMMARY_LIST = TypeAdapter(List[InvoiceSummaryResponse])
+
 UPLOAD_DIR = Path(settings.UPLOAD_DIR)
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
 
-@router.post("/upload", status_code=status.HTTP_201_CREATED)
-def upload_invoice(
-    file: UploadFile = File(...),
-    llm_provider: str = Form(None),
-    llm_model: str = Form(None),
-    db: Session = Depends(get_db)
-):
-    """Upload an invoice file (PDF/image), create a DB record, and parse it automatically."""
-    # Save file to uploads directory
-    file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in settings.ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=400, detail="Unsupported file type.")
-    save_path = UPLOAD_DIR / file.filename
-    with save_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    # Create placeholder DB record (expand as needed)
+async def _save_upload(file: UploadFile, save_path: Path) -> str:
+    """Stream an upload to disk in chunks, enforcing MAX_FILE_SIZE as bytes arrive.
+
+    Returns the BLAKE2b-128 hex digest of the content, hashed alongside the write.
+    """
+    written = 0
+    digest = hashlib.blake2b(digest_size=16)
+    async with aiofiles.open(save_path, "wb") as out:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            written += len(chunk)
+            if written > settings.MAX_FILE_SIZE:
+                break
+            digest.update(chunk)
+            await out.write(chunk)
+    if written > settings.MAX_FILE_SIZE:
+        save_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail="File too large.")
+    return digest.hexdigest()
+
+def _invoice_file_path(invoice: Invoice) -> Path:
+    """Location of an invoice's uploaded file.
+
+    Deduplicated uploads are stored as ``<content_hash><ext>``; older ones under
+    their original filename.
+    """
+    if invoice.content_hash:
+        return UPLOAD_DIR / f"{invoice.content_hash}{os.path.splitext(invoice.invoice_number)[1].lower()}"
+    return UPLOAD_DIR / invoice.invoice_number
+
+def _find_invoice_by_hash(db: Session, content_hash: str) -> Optional[Invoice]:
+    """Fetch a previously uploaded invoice with identical file content."""
+    return db.query(Invoice).filter(Invoice.content_hash == content_hash).first()
+
+def _create_invoice(db: Session, filename: str, content_hash: Optional[str] = None) -> Invoice:
+    """Create the placeholder DB record for an uploaded file, queued for parsing."""
     invoice = Invoice(
         vendor_id=1,  # TODO: Replace with actual vendor logic
-        invoice_number=file.filename,
+        invoice_number=filename,
         invoice_date=datetime.now().date(),  # Use current date as placeholder
         total=None,
         raw_text=None,
         parsed_data=None,
+        content_hash=content_hash,
+        status="processing",
     )
     db.add(invoice)
     db.commit()
     db.refresh(invoice)
+    return invoice
+
+def _get_invoice(db: Session, invoice_id: int) -> Optional[Invoice]:
+    """Fetch an invoice by id."""
+    return db.query(Invoice).filter(Invoice.id == invoice_id).first()
+
+def _item_rows(invoice_id: int, items: list) -> List[dict]:
+    """Build invoice_items rows from parsed line items."""
+    def number(value):
+        # Left as a string when the pipeline could not convert it
+        return value if isinstance(value, (int, float)) else None
+    
+    return [
+        {
+            "invoice_id": invoice_id,
+            "sku": item.get("sku"),
+            "description": item.get("description"),
+            "quantity": number(item.get("quantity")),
+            "unit_price": number(item.get("unit_price")),
+            "total": number(item.get("total")),
+        }
+        for item in items
+        if isinstance(item, dict)
+    ]
+
+def _key_value(column, value) -> Optional[str]:
+    """A parsed_data value as text for an indexed String column, cut to the column length."""
+    return str(value)[:column.type.length] if value else None
+
+def _assign_parse_result(db: Session, invoice: Invoice, result: dict) -> None:
+    """Copy pipeline output onto the invoice and replace its items, without committing."""
+    invoice.raw_text = result.get("raw_text")
+    invoice.parsed_data = result.get("parsed_data")
+    invoice.confidence_score = result.get("confidence_score", 0.0)
+    invoice.status = "parsed"
+    
+    # Update basic fields if available
+    if result.get("parsed_data"):
+        parsed = result["parsed_data"]
+        invoice.invoice_date = parsed.get("invoice_date")
+        invoice.total = parsed.get("total")
+        invoice.subtotal = parsed.get("subtotal")
+        invoice.tax = parsed.get("tax")
+        invoice.parsed_vendor_name = _key_value(Invoice.parsed_vendor_name, parsed.get("vendor_name"))
+        invoice.parsed_invoice_number = _key_value(Invoice.parsed_invoice_number, parsed.get("invoice_number"))
+        
+        # Replace line items in one DELETE and one executemany INSERT
+        db.execute(delete(InvoiceItem).where(InvoiceItem.invoice_id == invoice.id))
+        rows = _item_rows(invoice.id, parsed.get("items") or [])
+        if rows:
+            # render_nulls keeps rows with missing fields in the same batch
+            db.execute(insert(InvoiceItem).execution_options(render_nulls=True), rows)
+
+def _apply_parse_result(db: Session, invoice: Invoice, result: dict) -> None:
+    """Store pipeline output on the invoice and commit."""
+    _assign_parse_result(db, invoice, result)
+    db.commit()
+    db.refresh(invoice)
+    logger.debug("invoice_saved", invoice_id=invoice.id, parsed_data=invoice.parsed_data)
+
+def _mark_invoice_error(db: Session, invoice: Invoice) -> None:
+    """Flag an invoice whose parse failed."""
+    db.rollback()
+    invoice.status = "error"
+    db.commit()
+    db.refresh(invoice)
+
+def _mark_invoice_processing(db: Session, invoice: Invoice) -> None:
+    """Flag an invoice whose parse has been queued."""
+    invoice.status = "processing"
+    db.commit()
+    db.refresh(invoice)
+
+def _store_parse_result(invoice_id: int, result: dict) -> None:
+    """Persist a parse result outside the request, using a session of its own."""
+    db = SessionLocal()
+    try:
+        invoice = _get_invoice(db, invoice_id)
+        if invoice is None:
+            return
+        if not result.get("success"):
+            _mark_invoice_error(db, invoice)
+            return
+        try:
+            _apply_parse_result(db, invoice, result)
+        except Exception as e:
+            logger.error(f"Error storing parsed invoice {invoice_id}: {e}")
+            _mark_invoice_error(db, invoice)
+    finally:
+        db.close()
 
-    # --- Automatically trigger parsing ---
-    file_path = save_path
+async def _run_parse_job(invoice_id: int, file_path: Path, llm_provider: Optional[str], llm_model: Optional[str]) -> None:
+    """Background task: parse an uploaded invoice and store the outcome."""
     try:
-        # Pass provider/model to pipeline if given
-        pipeline = InvoiceParsingPipeline(llm_provider=llm_provider, llm_model=llm_model)
-        import asyncio
-        result = asyncio.run(pipeline.parse_invoice(str(file_path)))
-        invoice.raw_text = result.get("raw_text")
-        invoice.parsed_data = result.get("parsed_data")
-        invoice.confidence_score = result.get("confidence_score", 0.0)
-        invoice.status = "parsed"
-        if result.get("parsed_data"):
-            parsed = result["parsed_data"]
-            invoice.invoice_date = parsed.get("invoice_date")
-            invoice.total = parsed.get("total")
-            invoice.subtotal = parsed.get("subtotal")
-            invoice.tax = parsed.get("tax")
-        db.commit()
-        db.refresh(invoice)
-        print("💾 [DEBUG] Saved to DB - parsed_data:", invoice.parsed_data)
-        print("💾 [DEBUG] Saved to DB - raw_text:", str(invoice.raw_text)[:500])
+        pipeline = get_pipeline(llm_provider, llm_model)
+        result = await pipeline.parse_invoice(str(file_path), invoice_id)
     except Exception as e:
-        logger.error(f"Error parsing invoice {invoice.id}: {e}")
-        invoice.status = "error"
-        db.commit()
+        logger.error(f"Error parsing invoice {invoice_id}: {e}")
+        result = {"success": False, "error": str(e)}
+    await run_in_threadpool(_store_parse_result, invoice_id, result)
+
+def _get_invoices(db: Session, invoice_ids: List[int]) -> List[Invoice]:
+    """Fetch the invoices with the given ids."""
+    return db.query(Invoice).filter(Invoice.id.in_(invoice_ids)).all()
+
+def _apply_batch_results(db: Session, outcomes: List[tuple]) -> List[tuple]:
+    """Store a batch of (invoice, pipeline result) pairs in one commit.
+
+    Each invoice is written in its own savepoint, so a row the database rejects marks
+    only that invoice ``error`` instead of rolling back the batch.
+    Returns (invoice_id, status, error) triples read before the commit expires the instances.
+    """
+    statuses = []
+    for invoice, result in outcomes:
+        invoice_id = invoice.id
+        error = None
+        if not result.get("success"):
+            logger.error(f"Error parsing invoice {invoice_id}: {result.get('details')}")
+            invoice.status = "error"
+            error = "Error parsing invoice."
+        else:
+            try:
+                with db.begin_nested():
+                    _assign_parse_result(db, invoice, result)
+                    db.flush()
+            except Exception as e:
+                logger.error(f"Error storing parsed invoice {invoice_id}: {e}")
+                invoice.status = "error"
+                error = "Error storing parsed invoice."
+        statuses.append((invoice_id, invoice.status, error))
+    db.commit()
+    return statuses
+
+# Route handlers below are async so the pipeline can be awaited; the blocking
+# Session calls are pushed onto the threadpool to keep the event loop free.
+# Single-invoice parses run as background tasks after the response is sent;
+# clients poll GET /invoices/{id}/parse_status (or GET /invoices/{id}).
+
+@router.post("/upload", status_code=status.HTTP_201_CREATED)
+async def upload_invoice(
+    response: Response,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    llm_provider: str = Form(None),
+    llm_model: str = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Upload an invoice file (PDF/image), create a DB record, and queue it for parsing.
+
+    The invoice is returned with status ``processing``. Re-uploading a file with identical content returns the existing invoice (200)
+    without parsing it again.
+    """
+    # Save file to a temporary name in the uploads directory
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    if file_ext not in settings.ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported file type.")
+    temp_path = UPLOAD_DIR / f".upload-{uuid.uuid4().hex}{file_ext}"
+    content_hash = await _save_upload(file, temp_path)
+
+    existing = await run_in_threadpool(_find_invoice_by_hash, db, content_hash)
+    if existing:
+        temp_path.unlink(missing_ok=True)
+        response.status_code = status.HTTP_200_OK
+        return existing
+
+    file_path = UPLOAD_DIR / f"{content_hash}{file_ext}"
+    os.replace(temp_path, file_path)
+    # Create placeholder DB record (expand as needed)
+    invoice = await run_in_threadpool(_create_invoice, db, file.filename, content_hash)
+
+    # --- Automatically trigger parsing once the response is sent ---
+    background_tasks.add_task(_run_parse_job, invoice.id, file_path, llm_provider, llm_model)
 
-    # Return the invoice details (including parsed_data if successful)
     return invoice
 
-@router.post("/{invoice_id}/parse", status_code=status.HTTP_200_OK)
+@router.post("/parse_batch", response_model=List[ParseBatchResult])
+async def parse_invoice_batch(request: ParseBatchRequest, db: Session = Depends(get_db)):
+    """Parse several uploaded invoices concurrently and store the results in one commit.
+
+    At most ``PARSE_BATCH_CONCURRENCY`` invoices are in the pipeline at once; raise
+    ``OLLAMA_NUM_PARALLEL`` on the Ollama server so it can serve them in parallel.
+    """
+    invoices = await run_in_threadpool(_get_invoices, db, request.invoice_ids)
+    found = {invoice.id: invoice for invoice in invoices}
+    
+    results = {}
+    to_parse = []
+    for invoice_id in request.invoice_ids:
+        invoice = found.get(invoice_id)
+        if invoice is None:
+            results[invoice_id] = ParseBatchResult(invoice_id=invoice_id, status="not_found", error="Invoice not found.")
+        elif not await aiofiles.os.path.exists(_invoice_file_path(invoice)):
+            results[invoice_id] = ParseBatchResult(invoice_id=invoice_id, status="not_found", error="Invoice file not found.")
+        elif invoice_id not in results:
+            results[invoice_id] = None
+            to_parse.append(invoice)
+    
+    pipeline = get_pipeline(request.llm_provider, request.llm_model)
+    outcomes = await pipeline.parse_invoices_batch([str(_invoice_file_path(invoice)) for invoice in to_parse],
+                                                   invoice_ids=[invoice.id for invoice in to_parse])
+    statuses = await run_in_threadpool(_apply_batch_results, db, list(zip(to_parse, outcomes)))
+    
+    for invoice_id, invoice_status, error in statuses:
+        results[invoice_id] = ParseBatchResult(invoice_id=invoice_id, status=invoice_status, error=error)
+    
+    return list(results.values())
+
+@router.post("/{invoice_id}/parse", status_code=status.HTTP_202_ACCEPTED)
 async def parse_invoice(
     invoice_id: int, 
+    background_tasks: BackgroundTasks,
     llm_provider: str = Form(None),
     llm_model: str = Form(None),
     db: Session = Depends(get_db)
 ):
-    """Parse an uploaded invoice using OCR and LLM."""
+    """Queue an uploaded invoice for parsing with OCR and LLM.
+
+    Poll ``GET /invoices/{invoice_id}/parse_status`` until the status leaves ``processing``.
+    """
     # Get invoice from database
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+    invoice = await run_in_threadpool(_get_invoice, db, invoice_id)
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found.")
     
     # Find the uploaded file
-    file_path = UPLOAD_DIR / invoice.invoice_number
-    if not file_path.exists():
+    file_path = _invoice_file_path(invoice)
+    if not await aiofiles.os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="Invoice file not found.")
     
-    try:
-        # Initialize parsing pipeline with provider/model if provided
-        pipeline = InvoiceParsingPipeline(llm_provider=llm_provider, llm_model=llm_model)
-        
-        # Parse the invoice
-        result = await pipeline.parse_invoice(str(file_path))
-        
-        # Update invoice with parsed data
-        invoice.raw_text = result.get("raw_text")
-        invoice.parsed_data = result.get("parsed_data")
-        invoice.confidence_score = result.get("confidence_score", 0.0)
-        invoice.status = "parsed"
-        
-        # Update basic fields if available
-        if result.get("parsed_data"):
-            parsed = result["parsed_data"]
-            invoice.invoice_date = parsed.get("invoice_date")
-            invoice.total = parsed.get("total")
-            invoice.subtotal = parsed.get("subtotal")
-            invoice.tax = parsed.get("tax")
-        
-        db.commit()
-        db.refresh(invoice)
-        print("💾 [DEBUG] Saved to DB - parsed_data:", invoice.parsed_data)
-        print("💾 [DEBUG] Saved to DB - raw_text:", str(invoice.raw_text)[:500])
-        
-        return {"message": "Invoice parsed successfully", "invoice_id": invoice_id}
-        
-    except Exception as e:
-        logger.error(f"Error parsing invoice {invoice_id}: {e}")
-        raise HTTPException(status_code=500, detail="Error parsing invoice.")
+    await run_in_threadpool(_mark_invoice_processing, db, invoice)
+    background_tasks.add_task(_run_parse_job, invoice_id, file_path, llm_provider, llm_model)
+    
+    return {"message": "Invoice parsing started", "invoice_id": invoice_id, "status": "processing"}
+
+@router.get("/{invoice_id}/parse_status")
+def get_parse_status(invoice_id: int, db: Session = Depends(get_db)):
+    """Get the parse status of an invoice."""
+    invoice = (
+        db.query(Invoice)
+        .options(load_only(Invoice.id, Invoice.status, Invoice.confidence_score))
+        .filter(Invoice.id == invoice_id)
+        .first()
+    )
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found.")
+    
+    return {
+        "invoice_id": invoice.id,
+        "status": invoice.status,
+        "confidence_score": invoice.confidence_score,
+    }
+
+@router.post("/{invoice_id}/parse/stream")
+async def stream_parse_invoice(
+    invoice_id: int,
+    llm_provider: str = Form(None),
+    llm_model: str = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Parse an uploaded invoice, streaming progress and LLM tokens as NDJSON.
+
+    Emits ``ocr``, ``token`` and a final ``result`` event, one JSON object per line.
+    The result is stored on the invoice before the stream closes.
+    """
+    invoice = await run_in_threadpool(_get_invoice, db, invoice_id)
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found.")
+    
+    file_path = _invoice_file_path(invoice)
+    if not await aiofiles.os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail="Invoice file not found.")
+    
+    pipeline = get_pipeline(llm_provider, llm_model)
+    
+    async def events():
+        # The request-scoped session is closed once the response starts, so the
+        # final result is written through a session owned by this generator.
+        async for event in pipeline.stream_parse(str(file_path), invoice_id):
+            if event["event"] == "result":
+                await run_in_threadpool(_store_parse_result, invoice_id, event)
+            yield orjson.dumps(event, default=str) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 @router.get("/{invoice_id}", response_model=InvoiceResponse)
 def get_invoice(invoice_id: int, db: Session = Depends(get_db)):
     """Get parsed invoice details."""
-    invoice = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+    invoice = (
+        db.query(Invoice)
+        .options(*INVOICE_RESPONSE_OPTIONS)
+        .filter(Invoice.id == invoice_id)
+        .first()
+    )
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found.")
     
     return invoice
 
-@router.get("/", response_model=List[InvoiceResponse])
-def list_invoices(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """List all invoices with pagination."""
-    invoices = db.query(Invoice).offset(skip).limit(limit).all()
-    return invoices 
\ No newline at end of file
+@router.get("/", response_model=List[InvoiceSummaryResponse])
+def list_invoices(
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """List invoice summaries, newest first, using keyset pagination on the primary key.
+
+    Use ``GET /invoices/{id}`` for the full record with raw text and parsed data.
+
+    Pass the ``X-Next-Cursor`` response header back as ``after_id`` to fetch the next page.
+    """
+    query = db.query(Invoice).options(*INVOICE_SUMMARY_OPTIONS)
+    if after_id is not None:
+        query = query.filter(Invoice.id < after_id)
+    invoices = query.order_by(Invoice.id.desc()).limit(limit).all()
+    summaries = [
+        InvoiceSummaryResponse.model_construct(
+            **{name: getattr(invoice, name) for name in INVOICE_SUMMARY_FIELDS},
+            vendor=VendorSummary.model_construct(id=invoice.vendor.id, name=invoice.vendor.name)
+            if invoice.vendor else None,
+        )
+        for invoice in invoices
+    ]
+    headers = {}
+    if len(invoices) == limit:
+        headers[NEXT_CURSOR_HEADER] = str(invoices[-1].id)
+    return Response(INVOICE_SUMMARY_LIST.dump_json(summaries), media_type="application/json", headers=headers) 
\ No newline at end of file
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Date, Numeric, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Date, Numeric, Text, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.sql import func
 
 Base = declarative_base()
 
@@ -13,8 +14,8 @@ class Vendor(Base):
     name = Column(String(255), nullable=False, index=True)
     email = Column(String(255))
     phone = Column(String(50))
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
     # Relationships
     invoices = relationship("Invoice", back_populates="vendor")
@@ -22,6 +23,12 @@ class Vendor(Base):
 class Invoice(Base):
     """Invoice model"""
     __tablename__ = "invoices"
+    __table_args__ = (
+        Index("ix_invoices_vendor_date", "vendor_id", "invoice_date"),
+        # Duplicate checks: exact vendor + number, and same vendor on the same day
+        Index("ix_invoices_parsed_vendor_number", "parsed_vendor_name", "parsed_invoice_number"),
+        Index("ix_invoices_parsed_vendor_date", "parsed_vendor_name", "invoice_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     vendor_id = Column(Integer, ForeignKey("vendors.id"), nullable=False)
@@ -34,9 +41,14 @@ class Invoice(Base):
     status = Column(String(50), default="parsed")
     confidence_score = Column(Numeric(3, 2))
     raw_text = Column(Text)
-    parsed_data = Column(JSON)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    parsed_data = Column(JSON().with_variant(JSONB(), "postgresql"))
+    # Copies of parsed_data's vendor_name/invoice_number (invoice_number above holds the
+    # uploaded filename), as plain columns so duplicate checks can use an index
+    parsed_vendor_name = Column(String(255))
+    parsed_invoice_number = Column(String(100))
+    content_hash = Column(String(32), index=True)  # BLAKE2b-128 hex digest of the uploaded file
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
     # Relationships
     vendor = relationship("Vendor", back_populates="invoices")
@@ -48,13 +60,13 @@ class InvoiceItem(Base):
     __tablename__ = "invoice_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=False)
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=False, index=True)
     sku = Column(String(100))
     description = Column(Text)
     quantity = Column(Numeric(10, 2))
     unit_price = Column(Numeric(10, 2))
     total = Column(Numeric(10, 2))
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
     invoice = relationship("Invoice", back_populates="items")
@@ -62,6 +74,10 @@ class InvoiceItem(Base):
 class Alert(Base):
     """Alert model"""
     __tablename__ = "alerts"
+    # Leading invoice_id column also serves plain per-invoice lookups
+    __table_args__ = (
+        Index("ix_alerts_invoice_status", "invoice_id", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     invoice_id = Column(Integer, ForeignKey("invoices.id"), nullable=False)
@@ -69,8 +85,8 @@ class Alert(Base):
     message = Column(Text, nullable=False)
     severity = Column(String(20), default="medium")
     status = Column(String(20), default="active")
-    created_at = Column(DateTime, default=datetime.utcnow)
-    resolved_at = Column(DateTime)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    resolved_at = Column(DateTime(timezone=True))
     
     # Relationships
     invoice = relationship("Invoice", back_populates="alerts") 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from datetime import date, datetime
 from decimal import Decimal
@@ -17,8 +17,7 @@ class Vendor(VendorBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class InvoiceItemBase(BaseModel):
     sku: Optional[str] = Field(None, description="Product SKU")
@@ -35,8 +34,7 @@ class InvoiceItem(InvoiceItemBase):
     invoice_id: int
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class InvoiceBase(BaseModel):
     invoice_number: str = Field(..., description="Invoice number")
@@ -67,8 +65,7 @@ class Invoice(InvoiceBase):
     vendor: Vendor
     items: List[InvoiceItem] = []
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class AlertBase(BaseModel):
     alert_type: str = Field(..., description="Type of alert")
@@ -85,8 +82,7 @@ class Alert(AlertBase):
     created_at: datetime
     resolved_at: Optional[datetime]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Request/Response schemas
 class UploadResponse(BaseModel):
@@ -98,6 +94,16 @@ class UploadResponse(BaseModel):
 class ParseRequest(BaseModel):
     upload_id: str
 
+class ParseBatchRequest(BaseModel):
+    invoice_ids: List[int] = Field(..., description="Invoices to parse")
+    llm_provider: Optional[str] = Field(None, description="LLM provider override")
+    llm_model: Optional[str] = Field(None, description="LLM model override")
+
+class ParseBatchResult(BaseModel):
+    invoice_id: int
+    status: str
+    error: Optional[str] = None
+
 class ParseResponse(BaseModel):
     invoice_id: int
     status: str
@@ -139,8 +145,28 @@ class InvoiceResponse(BaseModel):
     items: List[InvoiceItem] = []
     alerts: List[Alert] = []
     
-    class Config:
-        from_attributes = True 
+    model_config = ConfigDict(from_attributes=True) 
+
+class VendorSummary(BaseModel):
+    """Vendor fields embedded in invoice listings"""
+    id: int
+    name: str
+    
+    model_config = ConfigDict(from_attributes=True)
+
+class InvoiceSummaryResponse(BaseModel):
+    """Invoice listing schema; omits raw_text, parsed_data and related rows"""
+    id: int
+    vendor_id: int
+    invoice_number: str
+    invoice_date: Optional[date]
+    total: Optional[Decimal]
+    status: str
+    created_at: datetime
+    
+    vendor: Optional[VendorSummary] = None
+    
+    model_config = ConfigDict(from_attributes=True)
 
 class AlertResponse(BaseModel):
     """Alert response schema for API"""
@@ -153,5 +179,4 @@ class AlertResponse(BaseModel):
     created_at: datetime
     resolved_at: Optional[datetime]
     
-    class Config:
-        from_attributes = True 
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True) 
\ No newline at end of file
@@ -1,16 +1,36 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+import orjson
 import structlog
 
 logger = structlog.get_logger()
 
+def _connect_args() -> dict:
+    """Per-connection session settings, sent in the startup packet (no extra round trip)"""
+    if make_url(settings.DATABASE_URL).get_backend_name() != "postgresql":
+        return {}
+    return {
+        "options": (
+            f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS} "
+            f"-c idle_in_transaction_session_timeout={settings.DB_IDLE_IN_TRANSACTION_TIMEOUT_MS}"
+        )
+    }
+
 # Create database engine
+# Pool sizes are per process; scale DB_POOL_SIZE/DB_MAX_OVERFLOW with uvicorn --workers
 engine = create_engine(
     settings.DATABASE_URL,
+    connect_args=_connect_args(),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
     pool_pre_ping=True,
-    pool_recycle=300,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    json_serializer=lambda obj: orjson.dumps(obj, default=str).decode(),
+    json_deserializer=orjson.loads,
     echo=False  # Set to True for SQL debugging
 )
 
@@ -1,36 +1,74 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from app.config import settings
+from modules.llm.batcher import aclose_batchers
+from modules.llm.client import aclose_async_http_client
+from modules.ocr.tesseract_engine import shutdown_page_pool
+from modules.parsing.pipeline import get_pipeline
+import logging
+import orjson
 import structlog
 
 # Configure logging
+# Filtering bound logger drops calls below LOG_LEVEL before any processor runs
+# and renders straight to bytes, skipping the stdlib logging hop.
 structlog.configure(
     processors=[
-        structlog.stdlib.filter_by_level,
-        structlog.stdlib.add_logger_name,
-        structlog.stdlib.add_log_level,
-        structlog.stdlib.PositionalArgumentsFormatter(),
-        structlog.processors.TimeStamper(fmt="iso"),
-        structlog.processors.StackInfoRenderer(),
-        structlog.processors.format_exc_info,
-        structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
+        structlog.processors.add_log_level,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+        structlog.processors.format_exc_info,  # Only does work when exc_info is passed
+        structlog.processors.JSONRenderer(serializer=orjson.dumps)
     ],
     context_class=dict,
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    wrapper_class=structlog.stdlib.BoundLogger,
+    logger_factory=structlog.BytesLoggerFactory(),
+    wrapper_class=structlog.make_filtering_bound_logger(
+        logging.getLevelName(settings.LOG_LEVEL.upper())
+    ),
     cache_logger_on_first_use=True,
 )
 
 logger = structlog.get_logger()
 
+# Allowance for multipart boundaries and form fields around the uploaded file
+MULTIPART_OVERHEAD = 64 * 1024
+
+class RequestSizeLimitMiddleware:
+    """Reject requests whose declared Content-Length exceeds the upload limit.
+
+    Runs before the multipart body is parsed, so oversize uploads are refused
+    without being spooled to disk. The exact file size is still enforced while
+    the upload is written.
+    """
+    
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            content_length = dict(scope["headers"]).get(b"content-length")
+            if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+                response = ORJSONResponse({"detail": "File too large."}, status_code=413)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
 # Create FastAPI app
 app = FastAPI(
     title="BevScan API",
     description="Smart Invoice Parser for Beverage Teams",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+app.add_middleware(RequestSizeLimitMiddleware, max_body_size=settings.MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+
+# Compress JSON bodies (raw_text/parsed_data make invoice payloads large).
+# Middleware added later wraps earlier ones, so CORS stays outermost.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +76,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Keyset pagination cursor
 )
 
 @app.on_event("startup")
@@ -46,11 +85,20 @@ async def startup_event():
     logger.info("Starting BevScan API server")
     logger.info(f"Environment: {settings.LLM_PROVIDER} LLM provider")
     logger.info(f"Database: {settings.DATABASE_URL}")
+    # Build the default pipeline now so the first parse request doesn't pay for it
+    try:
+        get_pipeline()
+    except Exception as e:
+        logger.warning(f"Default parsing pipeline unavailable: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown event"""
     logger.info("Shutting down BevScan API server")
+    # Batchers first: their in-flight requests use the shared HTTP client
+    await aclose_batchers()
+    await aclose_async_http_client()
+    shutdown_page_pool()
 
 @app.get("/")
 async def root():
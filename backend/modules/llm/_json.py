@@ -0,0 +1,186 @@
+"""
+JSON helpers shared by the LLM clients
+Uses orjson when it is installed and falls back to the stdlib json module.
+"""
+
+import re
+import functools
+import json
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError (and ValueError)
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Parse JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize obj to a JSON string, optionally indented by two spaces"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+    return json.dumps(obj, indent=2 if indent else None)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialize obj to compact UTF-8 JSON bytes, e.g. for an HTTP request body"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+# Characters that affect object nesting; everything else is skipped by the regex engine
+_STRUCTURAL = re.compile(r'[{}"\\]')
+
+
+def iter_json_objects(text: str, start: int = 0) -> Iterator[str]:
+    """
+    Yield balanced {...} slices of text in order of their opening brace
+    Single pass per candidate over structural characters only, tracking string
+    and escape state so braces inside strings are ignored
+    """
+    while True:
+        begin = text.find('{', start)
+        if begin == -1:
+            return
+        depth = 0
+        in_string = False
+        skip_to = -1  # Position after an escaped character
+        for match in _STRUCTURAL.finditer(text, begin):
+            pos = match.start()
+            if pos < skip_to:
+                continue
+            char = match.group()
+            if in_string:
+                if char == '\\':
+                    skip_to = pos + 2
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    yield text[begin:pos + 1]
+                    break
+        else:
+            return  # Unbalanced to the end of text
+        start = begin + 1
+
+
+def extract_json_object(text: str) -> Dict[str, Any]:
+    """Parse the first balanced JSON object embedded in text (e.g. an LLM reply)"""
+    for candidate in iter_json_objects(text):
+        try:
+            return loads(candidate)
+        except JSONDecodeError:
+            continue
+    raise ValueError("No JSON object found in response")
+
+
+def extract_json_array(text: str) -> List[Any]:
+    """Parse the outermost JSON array embedded in text (e.g. an LLM reply)"""
+    begin = text.find('[')
+    end = text.rfind(']')
+    if begin != -1 and end > begin:
+        try:
+            value = loads(text[begin:end + 1])
+        except JSONDecodeError:
+            pass
+        else:
+            if isinstance(value, list):
+                return value
+    raise ValueError("No JSON array found in response")
+
+
+# id(schema) -> (schema, rendered value); holding the schema keeps its id from being reused
+_instructions_cache: Dict[int, Tuple[Dict[str, Any], str]] = {}
+_json_schema_cache: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+_openapi_schema_cache: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+_SCHEMA_CACHE_SIZE = 256
+
+# Leading word of an example value that names a type; anything else is a string
+_HINT_TYPES = ("number", "integer", "boolean")
+
+
+def _per_schema(cache: Dict[int, Tuple[Dict[str, Any], Any]], schema: Dict[str, Any],
+                build: Callable[[Dict[str, Any]], Any]) -> Any:
+    """Build a value once per schema object; schemas are expected to be constants"""
+    entry = cache.get(id(schema))
+    if entry is not None and entry[0] is schema:
+        return entry[1]
+    value = build(schema)
+    if len(cache) < _SCHEMA_CACHE_SIZE:
+        cache[id(schema)] = (schema, value)
+    return value
+
+
+def _render_instructions(schema: Dict[str, Any]) -> str:
+    return (f"Respond with valid JSON following this schema:\n{dumps(schema)}\n"
+            f"Output minified JSON only, no whitespace, no markdown code fences, "
+            f"keys in this exact order: {', '.join(schema)}")
+
+
+def structured_instructions(schema: Dict[str, Any]) -> str:
+    """Prompt text asking for minified JSON matching schema, with the schema itself kept compact"""
+    return _per_schema(_instructions_cache, schema, _render_instructions)
+
+
+def _example_to_schema(example: Any, openapi: bool = False) -> Dict[str, Any]:
+    """
+    Convert an example-style schema to JSON Schema, or with openapi=True to the
+    OpenAPI subset Gemini accepts (upper-case type names, nullable flag)
+    """
+    def typed(name: str) -> Dict[str, Any]:
+        return {"type": name.upper() if openapi else name}
+    
+    if isinstance(example, dict):
+        return {
+            **typed("object"),
+            "properties": {key: _example_to_schema(value, openapi) for key, value in example.items()},
+            "required": list(example),
+        }
+    if isinstance(example, list):
+        return {**typed("array"), "items": _example_to_schema(example[0] if example else "string", openapi)}
+    if isinstance(example, bool):
+        return typed("boolean")
+    if isinstance(example, (int, float)):
+        return typed("number")
+    
+    hint = str(example)
+    kind = hint.split(maxsplit=1)[0].lower() if hint.strip() else "string"
+    field = typed(kind if kind in _HINT_TYPES else "string")
+    if hint.lower() not in ("string", *_HINT_TYPES):
+        field["description"] = hint
+    if "null" in hint.lower():
+        if openapi:
+            field["nullable"] = True
+        else:
+            field["type"] = [field["type"], "null"]
+    return field
+
+
+def json_schema(example: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert an example-style schema (e.g. {"total": "number (not string)"}) into
+    JSON Schema for grammar-constrained decoding; every key is required, in order
+    Leaf strings become the field description, so hints like "YYYY-MM-DD" are kept
+    """
+    return _per_schema(_json_schema_cache, example, _example_to_schema)
+
+
+def openapi_schema(example: Dict[str, Any]) -> Dict[str, Any]:
+    """json_schema() in the OpenAPI subset used by Gemini's response_schema"""
+    return _per_schema(_openapi_schema_cache, example,
+                       functools.partial(_example_to_schema, openapi=True))
@@ -0,0 +1,182 @@
+"""
+Request coalescing for structured LLM extraction
+Prompts submitted within a short window are sent to the model as one combined
+prompt and the JSON array reply is split back out to the waiting callers.
+"""
+
+import copy
+import asyncio
+import weakref
+import structlog
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .client import LLMClient
+from .cache import LLMCache, response_cache
+from . import _json
+
+logger = structlog.get_logger()
+
+# (prompt, schema, future resolved with the parsed dict)
+_Request = Tuple[str, Dict[str, Any], asyncio.Future]
+
+# Every live batcher, so application shutdown can stop their tasks
+_batchers: "weakref.WeakSet[RequestBatcher]" = weakref.WeakSet()
+
+
+async def aclose_batchers():
+    """Close every RequestBatcher (application shutdown)"""
+    for batcher in list(_batchers):
+        await batcher.aclose()
+
+
+class RequestBatcher:
+    """Coalesce concurrent generate_structured calls into one LLM request"""
+
+    def __init__(self, client: LLMClient, max_batch_size: int = 8, batch_interval: float = 0.05):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.batch_interval = batch_interval  # Seconds to wait for more requests after the first
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Set[asyncio.Task] = set()  # Strong refs so dispatch tasks aren't collected
+        _batchers.add(self)
+
+    async def submit(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a structured extraction and wait for its result"""
+        key = self._cache_key(prompt, schema)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((prompt, schema, future))
+        return await future
+
+    async def aclose(self):
+        """Stop the collector and dispatch tasks, failing every request still waiting"""
+        tasks = list(self._pending)
+        if self._worker is not None:
+            tasks.append(self._worker)
+            self._worker = None
+        for task in tasks:
+            task.cancel()
+        # Cancelled tasks fail the requests they hold (see _fail)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self._queue is not None:
+            queued = []
+            while not self._queue.empty():
+                queued.append(self._queue.get_nowait())
+            self._fail(queued)
+            self._queue = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # Queues and futures belong to one event loop; start fresh if it changed
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect())
+
+    def _cache_key(self, prompt: str, schema: Dict[str, Any]) -> str:
+        # Same key as cached_generate_structured, so batched and single calls share entries
+        return LLMCache.make_key(self.client.model_name, prompt, {'structured': True, 'schema': schema})
+
+    async def _collect(self):
+        """Gather requests for up to batch_interval, then dispatch them grouped by schema"""
+        while True:
+            batch: List[_Request] = [await self._queue.get()]
+            deadline = self._loop.time() + self.batch_interval
+            try:
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - self._loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                self._fail(batch)
+                raise
+
+            groups: Dict[str, List[_Request]] = {}
+            for request in batch:
+                groups.setdefault(_json.dumps(request[1]), []).append(request)
+            for group in groups.values():
+                # Dispatch without blocking collection of the next batch
+                task = self._loop.create_task(self._dispatch(group))
+                self._pending.add(task)
+                task.add_done_callback(self._pending.discard)
+
+    async def _dispatch(self, group: List[_Request]):
+        try:
+            await self._dispatch_group(group)
+        except asyncio.CancelledError:
+            self._fail(group)
+            raise
+
+    async def _dispatch_group(self, group: List[_Request]):
+        if len(group) == 1:
+            prompt, schema, future = group[0]
+            await self._run_single(prompt, schema, future)
+            return
+
+        try:
+            results = await self._run_batch(group)
+        except Exception as e:
+            # A malformed combined reply shouldn't fail every caller; retry one by one
+            logger.warning("Batched LLM call failed, falling back to single requests",
+                           batch_size=len(group), error=str(e))
+            await asyncio.gather(*(self._run_single(*request) for request in group))
+            return
+
+        for (prompt, schema, future), result in zip(group, results):
+            response_cache.set(self._cache_key(prompt, schema), copy.deepcopy(result))
+            if not future.done():
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(requests: List[_Request]):
+        """Fail the callers of requests that will never be answered"""
+        for _, _, future in requests:
+            if not future.done():
+                future.set_exception(RuntimeError("Request batcher closed"))
+
+    async def _run_single(self, prompt: str, schema: Dict[str, Any], future: asyncio.Future):
+        try:
+            result = await self.client.agenerate_structured(prompt, schema)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    async def _run_batch(self, group: List[_Request]) -> List[Dict[str, Any]]:
+        schema = group[0][1]
+        # Uncached: a malformed combined reply must not be replayed on the next batch;
+        # the per-request results are cached once they parse
+        response_text = await self.client._agenerate(self._combine(group, schema))
+        results = _json.extract_json_array(response_text)
+        if len(results) != len(group) or not all(isinstance(r, dict) for r in results):
+            raise ValueError(f"Expected {len(group)} JSON objects, got {len(results)}")
+        return results
+
+    @staticmethod
+    def _combine(group: List[_Request], schema: Dict[str, Any]) -> str:
+        """Join prompts with numbered delimiters and ask for one array element per request"""
+        parts = [
+            f"You will receive {len(group)} independent requests, each between "
+            f"'### REQUEST n' and '### END n' markers.",
+            "Answer every request separately. Respond with a single JSON array containing "
+            f"exactly {len(group)} objects, in request order, each following this schema:",
+            _json.dumps(schema),
+            "Respond only with the minified JSON array, no whitespace, markdown or explanations.",
+            "",
+        ]
+        for n, (prompt, _, _) in enumerate(group, start=1):
+            parts.append(f"### REQUEST {n}\n{prompt}\n### END {n}")
+        return "\n".join(parts)
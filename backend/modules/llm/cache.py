@@ -0,0 +1,209 @@
+"""
+LLM response cache
+Exact-match cache keyed by a hash of model, prompt and generation parameters.
+Entries live in an in-memory LRU and, when LLM_CACHE_DIR is set, in a sqlite
+file that survives restarts and is shared between worker processes.
+"""
+
+import os
+import copy
+import json
+import time
+import struct
+import sqlite3
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from . import _json
+
+
+class DiskCache:
+    """sqlite-backed persistent tier for LLMCache"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "llm_cache.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        return _json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, _json.dumps_bytes(value), time.time())
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+class LLMCache:
+    """Thread-safe in-memory LRU cache for LLM responses, with optional disk tier"""
+
+    def __init__(self, maxsize: int = 1024, directory: Optional[str] = None):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = DiskCache(directory) if directory else None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, params: Dict[str, Any]) -> str:
+        """Build a cache key from model, prompt and generation parameters"""
+        digest = hashlib.sha256()
+        parts = (
+            str(model_name).encode(),
+            prompt.encode(),
+            json.dumps(params, sort_keys=True, default=str).encode(),
+        )
+        for part in parts:
+            # Length-prefix each part so field boundaries can't be forged
+            digest.update(struct.pack(">Q", len(part)))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return cached value or None"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        value = self.disk.get(key) if self.disk is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: Any):
+        """Store value, evicting the least recently used entry when full"""
+        self._remember(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def _remember(self, key: str, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached responses"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+        if self.disk is not None:
+            self.disk.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'disk_size': len(self.disk) if self.disk is not None else None,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+# Process-wide cache shared by all LLM clients
+response_cache = LLMCache(
+    maxsize=settings.LLM_CACHE_SIZE,
+    directory=settings.LLM_CACHE_DIR or None  # An empty LLM_CACHE_DIR= in .env also disables it
+)
+
+
+def cached_generate(func):
+    """Decorator for LLMClient.generate that serves repeated prompts from response_cache"""
+    @functools.wraps(func)
+    def wrapper(self, prompt: str, **kwargs) -> str:
+        key = LLMCache.make_key(self.model_name, prompt, kwargs)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = func(self, prompt, **kwargs)
+        response_cache.set(key, response)
+        return response
+
+    return wrapper
+
+
+def cached_generate_structured(func):
+    """Decorator for LLMClient.generate_structured that caches the parsed dict
+
+    Hits skip both the model call and JSON extraction. Callers get a copy, since
+    the pipeline converts values in place.
+    """
+    @functools.wraps(func)
+    def wrapper(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        key = LLMCache.make_key(self.model_name, prompt, {'structured': True, 'schema': schema})
+        cached = response_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        response = func(self, prompt, schema)
+        response_cache.set(key, copy.deepcopy(response))
+        return response
+
+    return wrapper
+
+
+def cached_agenerate(func):
+    """Decorator for LLMClient.agenerate; shares entries with cached_generate"""
+    @functools.wraps(func)
+    async def wrapper(self, prompt: str, **kwargs) -> str:
+        key = LLMCache.make_key(self.model_name, prompt, kwargs)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+
+        response = await func(self, prompt, **kwargs)
+        response_cache.set(key, response)
+        return response
+
+    return wrapper
+
+
+def cached_agenerate_structured(func):
+    """Decorator for LLMClient.agenerate_structured; shares entries with cached_generate_structured"""
+    @functools.wraps(func)
+    async def wrapper(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        key = LLMCache.make_key(self.model_name, prompt, {'structured': True, 'schema': schema})
+        cached = response_cache.get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        response = await func(self, prompt, schema)
+        response_cache.set(key, copy.deepcopy(response))
+        return response
+
+    return wrapper
@@ -1,10 +1,47 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, Awaitable, Callable
+import asyncio
+import contextlib
+import functools
+import importlib.util
+import time
 import os
+import httpx
+from . import _json
+
+# HTTP/2 needs the optional h2 package (httpx[http2]); plain-HTTP servers stay on HTTP/1.1 keep-alive
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Process-wide pooled AsyncClient shared by HTTP-based LLM clients"""
+    global _async_http_client
+    if _async_http_client is None or _async_http_client.is_closed:
+        _async_http_client = httpx.AsyncClient(
+            http2=_HTTP2,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=64)
+        )
+    return _async_http_client
+
+async def aclose_async_http_client():
+    """Close the shared AsyncClient (application shutdown)"""
+    global _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
 
 class LLMClient(ABC):
     """Abstract base class for LLM clients"""
     
+    # Cap on concurrent async calls for rate-limited remote providers (None = unbounded)
+    max_concurrency: Optional[int] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    
+    # Structured calls re-prompt with the parse error before giving up
+    structured_attempts: int = 3
+    structured_retry_backoff: float = 1.0  # Seconds, multiplied by the attempt number
+    
     @abstractmethod
     def generate(self, prompt: str, **kwargs) -> str:
         """Generate response from prompt"""
@@ -14,13 +51,101 @@ class LLMClient(ABC):
     def generate_structured(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
         """Generate structured response following schema"""
         pass
+    
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """
+        Async variant of generate()
+        Default implementation runs generate() in a worker thread; clients with
+        an async HTTP API override this
+        """
+        async with self._concurrency_limit():
+            return await asyncio.to_thread(self.generate, prompt, **kwargs)
+    
+    def _generate(self, prompt: str, **kwargs) -> str:
+        """
+        generate() without the response cache
+        Structured retries call this, so a reply that fails to parse is never cached
+        and replayed; clients whose generate() is cached override it
+        """
+        return self.generate(prompt, **kwargs)
+    
+    async def _agenerate(self, prompt: str, **kwargs) -> str:
+        """agenerate() without the response cache; see _generate()"""
+        return await self.agenerate(prompt, **kwargs)
+    
+    async def agenerate_structured(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of generate_structured()"""
+        async with self._concurrency_limit():
+            return await asyncio.to_thread(self.generate_structured, prompt, schema)
+    
+    def _parse_structured(self, response_text: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extract the JSON object from a structured response
+        Raises ValueError when there is no object or a top-level schema key is missing
+        """
+        # Sometimes models add extra text around the object
+        parsed = _json.extract_json_object(response_text)
+        missing = [key for key in schema if key not in parsed]
+        if missing:
+            raise ValueError(f"Missing keys: {', '.join(missing)}")
+        return parsed
+    
+    @staticmethod
+    def _feedback_prompt(prompt: str, error: Exception) -> str:
+        """Prompt for a retry, telling the model what was wrong with its last answer"""
+        return f"""{prompt}
+
+Your previous JSON had this error: {error}. Return corrected minified JSON only."""
+    
+    def _structured_with_retries(self, generate: Callable[[str], str], prompt: str,
+                                 schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Call generate until its reply parses, feeding each error back into the prompt"""
+        for attempt in range(1, self.structured_attempts + 1):
+            response_text = generate(prompt)
+            try:
+                return self._parse_structured(response_text, schema)
+            except ValueError as e:
+                if attempt == self.structured_attempts:
+                    raise Exception(f"Failed to parse JSON response: {e}. Raw response: {response_text[:200]}...")
+                prompt = self._feedback_prompt(prompt, e)
+                time.sleep(self.structured_retry_backoff * attempt)
+    
+    async def _astructured_with_retries(self, agenerate: Callable[[str], Awaitable[str]], prompt: str,
+                                        schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of _structured_with_retries()"""
+        for attempt in range(1, self.structured_attempts + 1):
+            response_text = await agenerate(prompt)
+            try:
+                return self._parse_structured(response_text, schema)
+            except ValueError as e:
+                if attempt == self.structured_attempts:
+                    raise Exception(f"Failed to parse JSON response: {e}. Raw response: {response_text[:200]}...")
+                prompt = self._feedback_prompt(prompt, e)
+                await asyncio.sleep(self.structured_retry_backoff * attempt)
+    
+    def _concurrency_limit(self):
+        """Semaphore bounding in-flight async calls, or a no-op context"""
+        if self.max_concurrency is None:
+            return contextlib.nullcontext()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+    
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """
+        Stream response text from prompt as it is generated
+        Default implementation yields the full response once; clients with a
+        streaming API override this
+        """
+        yield await asyncio.to_thread(self.generate, prompt, **kwargs)
 
 class LLMFactory:
     """Factory for creating LLM clients"""
     
     @staticmethod
+    @functools.lru_cache(maxsize=8)
     def create_client(provider: str = None, model: str = None) -> LLMClient:
-        """Create LLM client based on provider and model"""
+        """Create LLM client based on provider and model (cached per provider/model pair)"""
         if not provider:
             provider = os.getenv('LLM_PROVIDER', 'ollama')
         
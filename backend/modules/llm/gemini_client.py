@@ -1,59 +1,106 @@
 import os
-import json
+import functools
 from typing import Dict, Any
-import google.generativeai as genai
 from .client import LLMClient
+from .cache import cached_generate, cached_generate_structured, cached_agenerate, cached_agenerate_structured
+from . import _json
+
+
+def response_schema(example: Any) -> Dict[str, Any]:
+    """
+    Convert an example-style schema (e.g. {"total": "number (not string)"}) into
+    the OpenAPI subset Gemini accepts as response_schema
+    """
+    return _json.openapi_schema(example)
 
 class GeminiClient(LLMClient):
     """Google Gemini client for LLM processing"""
     
+    max_concurrency = 4  # Stay under free-tier request rate limits
+    structured_max_tokens = 2048  # Output cap for structured calls; minified invoices fit well under it
+    
     def __init__(self, api_key: str = None, model_name: str = "gemini-1.5-flash"):
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         if not self.api_key:
             raise ValueError("Gemini API key is required")
         
+        self.model_name = model_name
+    
+    @functools.cached_property
+    def _genai(self):
+        """google.generativeai, imported and configured on first use"""
+        import google.generativeai as genai
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(model_name)
+        return genai
     
+    @functools.cached_property
+    def model(self):
+        return self._genai.GenerativeModel(self.model_name)
+    
+    @cached_generate
     def generate(self, prompt: str, **kwargs) -> str:
         """Generate response from prompt"""
+        return self._generate(prompt, **kwargs)
+    
+    def _generate(self, prompt: str, **kwargs) -> str:
+        """Uncached generate()"""
         try:
             response = self.model.generate_content(prompt, **kwargs)
             return response.text
         except Exception as e:
             raise Exception(f"Gemini API error: {e}")
     
+    @cached_agenerate
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Generate response from prompt without blocking the event loop"""
+        return await self._agenerate(prompt, **kwargs)
+    
+    async def _agenerate(self, prompt: str, **kwargs) -> str:
+        """Uncached agenerate()"""
+        async with self._concurrency_limit():
+            try:
+                response = await self.model.generate_content_async(prompt, **kwargs)
+                return response.text
+            except Exception as e:
+                raise Exception(f"Gemini API error: {e}")
+    
+    def _structured_config(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        # The API constrains decoding to the schema, so the prompt needn't describe it
+        # and the reply is bare JSON; the token cap bounds latency
+        return {
+            "response_mime_type": "application/json",
+            "response_schema": response_schema(schema),
+            "max_output_tokens": self.structured_max_tokens,
+        }
+    
+    def _parse_structured(self, response_text: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse a schema-constrained reply; no need to search for the object"""
+        parsed = _json.loads(response_text)
+        if not isinstance(parsed, dict):
+            raise ValueError("Response is not a JSON object")
+        missing = [key for key in schema if key not in parsed]
+        if missing:
+            raise ValueError(f"Missing keys: {', '.join(missing)}")
+        return parsed
+    
+    @cached_generate_structured
     def generate_structured(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate structured response following schema"""
-        # Create structured prompt with JSON schema
-        structured_prompt = f"""
-{prompt}
-
-Please respond with valid JSON following this exact schema:
-{json.dumps(schema, indent=2)}
-
-Important: Respond only with the JSON object, no additional text or explanations.
-"""
-        
-        response_text = self.generate(structured_prompt)
-        
-        # Try to extract JSON from response
-        try:
-            # Find JSON in response (sometimes models add extra text)
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            if start_idx != -1 and end_idx != 0:
-                json_str = response_text[start_idx:end_idx]
-                return json.loads(json_str)
-            else:
-                raise ValueError("No JSON found in response")
-        except json.JSONDecodeError as e:
-            raise Exception(f"Failed to parse JSON response: {e}")
+        """Generate structured response following schema, retrying with feedback on bad JSON"""
+        config = self._structured_config(schema)
+        return self._structured_with_retries(
+            lambda p: self._generate(p, generation_config=config), prompt, schema)
+    
+    @cached_agenerate_structured
+    async def agenerate_structured(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of generate_structured()"""
+        config = self._structured_config(schema)
+        return await self._astructured_with_retries(
+            lambda p: self._agenerate(p, generation_config=config), prompt, schema)
     
     def generate_with_safety_settings(self, prompt: str, safety_settings: list = None) -> str:
         """Generate response with custom safety settings"""
         if safety_settings:
-            model = genai.GenerativeModel('gemini-1.5-flash', safety_settings=safety_settings)
+            model = self._genai.GenerativeModel('gemini-1.5-flash', safety_settings=safety_settings)
         else:
             model = self.model
         
@@ -66,7 +113,7 @@ Important: Respond only with the JSON object, no additional text or explanations
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about available models"""
         try:
-            models = genai.list_models()
+            models = self._genai.list_models()
             return {
                 "models": [model.name for model in models if 'generateContent' in model.supported_generation_methods],
                 "current_model": self.model.model_name
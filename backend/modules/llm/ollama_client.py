@@ -1,84 +1,163 @@
 import requests
-import json
-from typing import Dict, Any
-from .client import LLMClient
+import httpx
+import structlog
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, AsyncIterator
+from .client import LLMClient, get_async_http_client
+from .cache import cached_generate, cached_generate_structured, cached_agenerate, cached_agenerate_structured
+from . import _json
+
+logger = structlog.get_logger()
 
 class OllamaClient(LLMClient):
     """Ollama client for local LLM processing"""
     
-    def __init__(self, model_name: str = "llama3.2", base_url: str = "http://localhost:11434"):
+    structured_max_tokens = 2048  # Output cap for structured calls; minified invoices fit well under it
+    
+    def __init__(self, model_name: str = "llama3.2", base_url: str = "http://localhost:11434",
+                 keep_alive: str = "30m", timeout: float = 120, debug: bool = False):
         self.base_url = base_url
         self.model = model_name
+        self.model_name = model_name
+        self.keep_alive = keep_alive  # Keep the model (and its KV cache) loaded between calls
+        self.timeout = timeout  # Seconds per generate request; local models can be slow
+        self.debug = debug  # Log extracted/raw structured responses
+        
+        # Pooled keep-alive connections; retry transient gateway errors
+        self._session = requests.Session()
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504],
+                        allowed_methods=frozenset({"GET", "POST"}))
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retries)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        # Async calls share the process-wide keep-alive pool; only the read timeout is Ollama's own
+        self._async_timeout = httpx.Timeout(self.timeout, connect=5.0)
+    
+    def close(self):
+        """Close pooled HTTP connections"""
+        self._session.close()
+    
+    async def aclose(self):
+        """Close pooled HTTP connections; the shared async pool is closed at app shutdown"""
+        self.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
     
+    def _generate_payload(self, prompt: str, stream: bool, **kwargs) -> Dict[str, Any]:
+        """Request body for /api/generate"""
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            **kwargs
+        }
+    
+    @cached_generate
     def generate(self, prompt: str, **kwargs) -> str:
         """Generate response from prompt"""
+        return self._generate(prompt, **kwargs)
+    
+    def _generate(self, prompt: str, **kwargs) -> str:
+        """Uncached generate()"""
         try:
-            response = requests.post(
+            response = self._session.post(
                 f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    **kwargs
-                },
-                timeout=120  # Increased from 30 to 120 seconds
+                data=_json.dumps_bytes(self._generate_payload(prompt, False, **kwargs)),
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout
             )
             response.raise_for_status()
-            return response.json()["response"]
+            # Parse the raw body bytes directly; only the "response" field is kept
+            return _json.loads(response.content)["response"]
         except requests.exceptions.RequestException as e:
             raise Exception(f"Ollama API error: {e}")
     
+    @cached_agenerate
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        """Generate response from prompt without blocking the event loop"""
+        return await self._agenerate(prompt, **kwargs)
+    
+    async def _agenerate(self, prompt: str, **kwargs) -> str:
+        """Uncached agenerate()"""
+        try:
+            response = await get_async_http_client().post(
+                f"{self.base_url}/api/generate",
+                content=_json.dumps_bytes(self._generate_payload(prompt, False, **kwargs)),
+                headers={"Content-Type": "application/json"},
+                timeout=self._async_timeout
+            )
+            response.raise_for_status()
+            return _json.loads(response.content)["response"]
+        except httpx.HTTPError as e:
+            raise Exception(f"Ollama API error: {e}")
+    
+    async def stream(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        """Stream response tokens from Ollama's NDJSON generate endpoint"""
+        payload = self._generate_payload(prompt, True, **kwargs)
+        try:
+            async with get_async_http_client().stream("POST", f"{self.base_url}/api/generate",
+                                                      content=_json.dumps_bytes(payload),
+                                                      headers={"Content-Type": "application/json"},
+                                                      timeout=self._async_timeout) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = _json.loads(line)
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+        except httpx.HTTPError as e:
+            raise Exception(f"Ollama API error: {e}")
+    
+    def _structured_options(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Extra /api/generate fields for a structured call"""
+        return {
+            # Schema instructions go in the system block: it is identical across calls,
+            # so Ollama can reuse the cached prefix and only prefill the per-call prompt
+            "system": _json.structured_instructions(schema),
+            # Schema-constrained decoding (Ollama 0.5+): the model can only emit JSON
+            # with the schema's keys, in order, and the declared value types
+            "format": _json.json_schema(schema),
+            "options": {"num_predict": self.structured_max_tokens},
+        }
+    
+    @cached_generate_structured
     def generate_structured(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate structured response following schema"""
-        # Add schema instructions to prompt
-        structured_prompt = f"""
-{prompt}
-
-Please respond with valid JSON following this schema:
-{json.dumps(schema, indent=2)}
-
-Response:
-"""
-        
-        response_text = self.generate(structured_prompt)
-        
-        # Try to extract JSON from response
+        """Generate structured response following schema, retrying with feedback on bad JSON"""
+        options = self._structured_options(schema)
+        return self._structured_with_retries(lambda p: self._generate(p, **options), prompt, schema)
+    
+    @cached_agenerate_structured
+    async def agenerate_structured(self, prompt: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of generate_structured()"""
+        options = self._structured_options(schema)
+        return await self._astructured_with_retries(lambda p: self._agenerate(p, **options), prompt, schema)
+    
+    def _parse_structured(self, response_text: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract the JSON object from a structured response"""
+        # Previews are only formatted when debugging; raw responses can be large
         try:
-            # Find JSON in response (sometimes models add extra text)
-            start_idx = response_text.find('{')
-            end_idx = response_text.rfind('}') + 1
-            if start_idx != -1 and end_idx != 0:
-                json_str = response_text[start_idx:end_idx]
-                # Try to parse the extracted JSON
-                parsed_json = json.loads(json_str)
-                print(f"🔍 [DEBUG] Extracted JSON: {json_str[:200]}...")
-                return parsed_json
-            else:
-                raise ValueError("No JSON found in response")
-        except json.JSONDecodeError as e:
-            # If JSON parsing fails, try to clean up the response
-            print(f"⚠️ [DEBUG] JSON parse error: {e}")
-            print(f"⚠️ [DEBUG] Raw response: {response_text[:500]}...")
-            
-            # Try to find and extract a valid JSON object
-            try:
-                # Look for JSON-like structure and try to fix common issues
-                cleaned_response = response_text.strip()
-                # Remove any text before the first {
-                if '{' in cleaned_response:
-                    cleaned_response = cleaned_response[cleaned_response.find('{'):]
-                # Remove any text after the last }
-                if '}' in cleaned_response:
-                    cleaned_response = cleaned_response[:cleaned_response.rfind('}')+1]
-                
-                return json.loads(cleaned_response)
-            except:
-                raise Exception(f"Failed to parse JSON response: {e}. Raw response: {response_text[:200]}...")
+            parsed_json = super()._parse_structured(response_text, schema)
+        except ValueError as e:
+            if self.debug:
+                logger.debug("Ollama JSON parse error", error=str(e), raw_response=response_text[:500])
+            raise
+        if self.debug:
+            logger.debug("Ollama extracted JSON", preview=str(parsed_json)[:200])
+        return parsed_json
     
     def list_models(self) -> list:
         """List available models"""
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
+            response = self._session.get(f"{self.base_url}/api/tags")
             response.raise_for_status()
             return response.json()["models"]
         except requests.exceptions.RequestException as e:
@@ -87,7 +166,7 @@ Response:
     def pull_model(self, model_name: str) -> bool:
         """Pull a model from Ollama registry"""
         try:
-            response = requests.post(
+            response = self._session.post(
                 f"{self.base_url}/api/pull",
                 json={"name": model_name}
             )
@@ -4,8 +4,9 @@ Supports multiple OCR backends with fallback mechanisms
 """
 
 import os
+import aiofiles.os
 import structlog
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from pathlib import Path
 import asyncio
 
@@ -31,7 +32,7 @@ class OCREngine:
             'total_processed': 0,
             'successful_extractions': 0,
             'failed_extractions': 0,
-            'average_confidence': 0.0
+            'sum_confidence': 0.0  # Average is derived in get_stats()
         }
     
     async def extract_text(self, file_path: str) -> Dict[str, Any]:
@@ -39,12 +40,11 @@ class OCREngine:
         Extract text from file (image or PDF)
         Returns: Dict with text, confidence, and metadata
         """
-        print("🔍 [DEBUG] OCR Engine: Starting extraction for:", file_path)
         logger.info(f"Starting OCR extraction for {file_path}")
         
         try:
             # Validate file
-            if not self._validate_file(file_path):
+            if not await self._validate_file(file_path):
                 return {
                     'success': False,
                     'error': 'Invalid file format or file not found'
@@ -54,23 +54,22 @@ class OCREngine:
             processed_path = await self._preprocess_image(file_path)
             
             # Try primary OCR engine
-            print("🔍 [DEBUG] OCR Engine: Using primary engine:", self.primary_engine)
             result = await self._extract_with_engine(processed_path, self.primary_engine)
-            print("🔍 [DEBUG] OCR Engine: Primary result:", result)
+            logger.debug("ocr_primary_result", engine=self.primary_engine, success=result['success'],
+                         error=result.get('error'))
             
             # If primary fails, try fallback
             if not result['success'] and self.primary_engine != "easyocr":
-                print("🔍 [DEBUG] OCR Engine: Primary failed, trying EasyOCR fallback")
                 logger.info("Primary OCR failed, trying EasyOCR fallback")
                 result = await self._extract_with_engine(processed_path, "easyocr")
-                print("🔍 [DEBUG] OCR Engine: Fallback result:", result)
+                logger.debug("ocr_fallback_result", success=result['success'], error=result.get('error'))
             
             # Update statistics
             self._update_stats(result)
             
             # Cleanup processed file if it's different from original
-            if processed_path != file_path and os.path.exists(processed_path):
-                os.remove(processed_path)
+            if processed_path != file_path and await aiofiles.os.path.exists(processed_path):
+                await aiofiles.os.remove(processed_path)
             
             return result
             
@@ -81,9 +80,23 @@ class OCREngine:
                 'error': str(e)
             }
     
-    def _validate_file(self, file_path: str) -> bool:
+    async def extract_text_batch(self, file_paths: List[str], max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Extract text from several files, in input order
+        Files share this engine's backends and Tesseract's page process pool;
+        at most max_concurrency (default CPU count) are in flight at once
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or os.cpu_count() or 1)
+        
+        async def extract_one(file_path: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.extract_text(file_path)
+        
+        return await asyncio.gather(*(extract_one(path) for path in file_paths))
+    
+    async def _validate_file(self, file_path: str) -> bool:
         """Validate file exists and is supported format"""
-        if not os.path.exists(file_path):
+        if not await aiofiles.os.path.exists(file_path):
             return False
         
         # Check file extension
@@ -95,9 +108,8 @@ class OCREngine:
     async def _preprocess_image(self, file_path: str) -> str:
         """Preprocess image for better OCR results"""
         try:
-            # For now, return original path
-            # TODO: Implement image preprocessing (denoising, deskewing, etc.)
-            return file_path
+            # Grayscale, binarize and deskew images; PDFs pass through unchanged
+            return await self.preprocessor.preprocess(file_path)
         except Exception as e:
             logger.warning(f"Image preprocessing failed: {e}")
             return file_path
@@ -127,14 +139,7 @@ class OCREngine:
         
         if result['success']:
             self.stats['successful_extractions'] += 1
-            confidence = result.get('confidence', 0.0)
-            
-            # Update average confidence
-            current_avg = self.stats['average_confidence']
-            total_successful = self.stats['successful_extractions']
-            self.stats['average_confidence'] = (
-                (current_avg * (total_successful - 1) + confidence) / total_successful
-            )
+            self.stats['sum_confidence'] += result.get('confidence', 0.0)
         else:
             self.stats['failed_extractions'] += 1
     
@@ -148,7 +153,9 @@ class OCREngine:
             'success_rate': (
                 self.stats['successful_extractions'] / max(self.stats['total_processed'], 1)
             ),
-            'average_confidence': self.stats['average_confidence']
+            'average_confidence': (
+                self.stats['sum_confidence'] / max(self.stats['successful_extractions'], 1)
+            )
         }
     
     def get_supported_formats(self) -> list:
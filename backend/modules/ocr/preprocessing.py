@@ -1,20 +1,72 @@
 """
-Image preprocessing utilities (placeholder)
+Image preprocessing utilities
+Grayscale, Otsu binarization and deskew with OpenCV before handing images to OCR
 """
 
+import os
+import asyncio
+import tempfile
 import structlog
-from typing import Dict, Any
 
 logger = structlog.get_logger()
 
+# PDFs are rasterized page by page by the OCR engine itself
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.tiff', '.bmp'}
+
 class ImagePreprocessor:
-    """Image preprocessing utilities (placeholder)"""
-    
+    """Image preprocessing utilities"""
+
+    # Skew below this many degrees isn't worth an interpolating rotation
+    min_skew_angle = 0.5
+
     def __init__(self):
         logger.info("Image preprocessor initialized")
-    
+
     async def preprocess(self, image_path: str) -> str:
-        """Preprocess image for better OCR results"""
-        # For now, return original path
-        # TODO: Implement image preprocessing (denoising, deskewing, etc.)
-        return image_path 
\ No newline at end of file
+        """
+        Preprocess image for better OCR results
+        Returns the path of a cleaned temporary PNG, or image_path unchanged for
+        non-image files; the caller removes the temporary file
+        """
+        if os.path.splitext(image_path)[1].lower() not in IMAGE_EXTENSIONS:
+            return image_path
+        return await asyncio.to_thread(self._preprocess_file, image_path)
+
+    def _preprocess_file(self, image_path: str) -> str:
+        import cv2
+
+        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return image_path  # Unreadable by OpenCV; let the OCR engine report it
+
+        # Otsu picks the threshold from the histogram: dark text on white
+        _, binary = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        binary = self._deskew(binary)
+
+        fd, output_path = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        cv2.imwrite(output_path, binary)
+        return output_path
+
+    def _deskew(self, binary):
+        """Rotate a binarized page so its text lines are horizontal"""
+        import cv2
+
+        # Fit a rotated rectangle around the ink (non-white) pixels
+        coords = cv2.findNonZero(cv2.bitwise_not(binary))
+        if coords is None:
+            return binary
+        angle = cv2.minAreaRect(coords)[-1]
+        # minAreaRect reports [-90, 0) on older OpenCV and (0, 90] on newer; fold into [-45, 45]
+        if angle < -45:
+            angle += 90
+        elif angle > 45:
+            angle -= 90
+        if abs(angle) < self.min_skew_angle:
+            return binary
+
+        height, width = binary.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        return cv2.warpAffine(binary, matrix, (width, height), flags=cv2.INTER_CUBIC,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
@@ -2,20 +2,110 @@
 Tesseract OCR Engine implementation
 """
 
+import io
 import os
+import atexit
 import structlog
-from typing import Dict, Any
+import shutil
+import functools
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 import asyncio
 from pathlib import Path
 
-try:
+logger = structlog.get_logger()
+
+# Resolution for rasterizing scanned PDF pages (pdf2image rendered at 200 too)
+PDF_RENDER_DPI = 200
+
+
+# Resolved once per process; a PATH lookup instead of spawning tesseract --version
+_TESSERACT_PATH = shutil.which('tesseract')
+_TESSERACT_AVAILABLE = _TESSERACT_PATH is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _run_tesseract(*args: str) -> Tuple[int, str]:
+    """Run the tesseract binary once per argument list; returns (returncode, stdout)"""
+    if not _TESSERACT_AVAILABLE:
+        return -1, ''
+    try:
+        result = subprocess.run([_TESSERACT_PATH, *args], capture_output=True, text=True)
+    except OSError:
+        return -1, ''
+    return result.returncode, result.stdout
+
+
+def _mean_confidence(conf: List[Any]) -> Optional[float]:
+    """Average of positive word confidences as 0-1, or None if no word was recognized"""
+    import numpy as np
+    
+    # One vectorized pass; Tesseract reports -1 for non-word boxes
+    scores = np.asarray(conf, dtype=np.float32)
+    words = scores[scores > 0]
+    return float(words.mean()) / 100.0 if words.size else None
+
+
+def _text_from_data(data: Dict[str, List[Any]]) -> str:
+    """
+    Rebuild page text from image_to_data word boxes
+    Words join with spaces, lines with newlines and blocks/paragraphs with blank lines
+    """
+    paragraphs: List[List[str]] = []
+    words: List[str] = []
+    line_key = para_key = None
+    for word, block, par, line in zip(data['text'], data['block_num'], data['par_num'], data['line_num']):
+        if not word or not word.strip():
+            continue
+        if (block, par) != para_key:
+            if words:
+                paragraphs[-1].append(' '.join(words))
+            paragraphs.append([])
+            words = []
+            para_key = (block, par)
+            line_key = line
+        elif line != line_key:
+            paragraphs[-1].append(' '.join(words))
+            words = []
+            line_key = line
+        words.append(word)
+    if words:
+        paragraphs[-1].append(' '.join(words))
+    return '\n\n'.join('\n'.join(lines) for lines in paragraphs)
+
+
+def _ocr_image(image) -> Tuple[str, Optional[float]]:
+    """
+    OCR a PIL image with a single Tesseract pass; returns (text, confidence or None if no words)
+    image_to_data already holds every recognized word, so image_to_string would only redo the work
+    """
     import pytesseract
+    
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    return _text_from_data(data), _mean_confidence(data['conf'])
+
+
+def _ocr_page(png: bytes) -> Tuple[str, Optional[float]]:
+    """OCR one PNG-encoded page; module-level so it can run in a worker process"""
     from PIL import Image
-    import pdf2image
-except ImportError as e:
-    structlog.get_logger().warning(f"Tesseract dependencies not available: {e}")
+    
+    return _ocr_image(Image.open(io.BytesIO(png)))
+
+
+@functools.lru_cache(maxsize=None)
+def _page_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all PDF extractions; pages are CPU-bound and independent"""
+    return ProcessPoolExecutor(max_workers=os.cpu_count())
+
+
+@atexit.register
+def shutdown_page_pool():
+    """Stop the page worker processes without waiting for queued pages (application shutdown)"""
+    if _page_pool.cache_info().currsize:
+        _page_pool().shutdown(wait=False, cancel_futures=True)
+        _page_pool.cache_clear()
 
-logger = structlog.get_logger()
 
 class TesseractEngine:
     """Tesseract OCR engine implementation"""
@@ -29,14 +119,7 @@ class TesseractEngine:
     
     def _check_availability(self) -> bool:
         """Check if Tesseract is available"""
-        try:
-            # Check if tesseract command is available
-            import subprocess
-            result = subprocess.run(['tesseract', '--version'], 
-                                  capture_output=True, text=True)
-            return result.returncode == 0
-        except Exception:
-            return False
+        return _TESSERACT_AVAILABLE
     
     def is_available(self) -> bool:
         """Check if Tesseract is available"""
@@ -47,9 +130,7 @@ class TesseractEngine:
         Extract text from file using Tesseract
         Supports images and PDFs
         """
-        print("🔍 [DEBUG] Tesseract: Starting extraction for:", file_path)
         if not self.available:
-            print("❌ [DEBUG] Tesseract: Not available")
             return {
                 'success': False,
                 'error': 'Tesseract not available'
@@ -73,18 +154,15 @@ class TesseractEngine:
     async def _extract_from_image(self, file_path: Path) -> Dict[str, Any]:
         """Extract text from image file"""
         try:
+            # Imported on first use so workers that never OCR an image skip the load cost
+            from PIL import Image
+            
             # Open image
             image = Image.open(file_path)
             
-            # Extract text with confidence
-            text = pytesseract.image_to_string(image)
-            
-            # Get confidence data
-            data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-            
-            # Calculate average confidence
-            confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-            avg_confidence = sum(confidences) / len(confidences) / 100.0 if confidences else 0.0
+            # Extract text and confidence from one OCR pass, off the event loop
+            text, confidence = await asyncio.to_thread(_ocr_image, image)
+            avg_confidence = confidence or 0.0
             
             return {
                 'success': True,
@@ -108,31 +186,33 @@ class TesseractEngine:
     async def _extract_from_pdf(self, file_path: Path) -> Dict[str, Any]:
         """Extract text from PDF file"""
         try:
-            # Convert PDF to images
-            images = pdf2image.convert_from_path(file_path)
+            # Read text layers and render scanned pages off the event loop
+            pages_in = await asyncio.to_thread(self._load_pdf_pages, file_path)
             
-            if not images:
+            if not pages_in:
                 return {
                     'success': False,
                     'error': 'No pages found in PDF'
                 }
             
-            # Extract text from all pages
+            # OCR pages without a text layer, in parallel
+            loop = asyncio.get_running_loop()
+            pool = _page_pool()
+            
+            async def read_page(text: Optional[str], png: Optional[bytes]) -> Tuple[str, Optional[float]]:
+                if text is not None:
+                    return text, 1.0  # Embedded text is exact
+                return await loop.run_in_executor(pool, _ocr_page, png)
+            
+            pages = await asyncio.gather(*(read_page(text, png) for text, png in pages_in))
+            
             all_text = []
             total_confidence = 0.0
             page_count = 0
             
-            for i, image in enumerate(images):
-                # Extract text from page
-                text = pytesseract.image_to_string(image)
+            for i, (text, page_confidence) in enumerate(pages):
                 all_text.append(f"--- Page {i+1} ---\n{text}")
-                
-                # Get confidence for this page
-                data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-                confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-                
-                if confidences:
-                    page_confidence = sum(confidences) / len(confidences) / 100.0
+                if page_confidence is not None:
                     total_confidence += page_confidence
                     page_count += 1
             
@@ -145,7 +225,8 @@ class TesseractEngine:
                 'confidence': avg_confidence,
                 'engine': 'tesseract',
                 'metadata': {
-                    'pages': len(images),
+                    'pages': len(pages_in),
+                    'ocr_pages': sum(1 for text, _ in pages_in if text is None),
                     'file_size': file_path.stat().st_size
                 }
             }
@@ -157,14 +238,30 @@ class TesseractEngine:
                 'error': str(e)
             }
     
+    @staticmethod
+    def _load_pdf_pages(file_path: Path) -> List[Tuple[Optional[str], Optional[bytes]]]:
+        """
+        Read each PDF page in-process with MuPDF as (text, None) when it has an
+        embedded text layer, or (None, PNG bytes) when it needs OCR
+        """
+        import pymupdf
+        
+        pages = []
+        with pymupdf.open(file_path) as doc:
+            for page in doc:
+                text = page.get_text("text")
+                if text.strip():
+                    pages.append((text, None))
+                else:
+                    pages.append((None, page.get_pixmap(dpi=PDF_RENDER_DPI).tobytes("png")))
+        return pages
+    
     def get_config(self) -> Dict[str, Any]:
         """Get Tesseract configuration"""
         try:
             # Get Tesseract version
-            import subprocess
-            result = subprocess.run(['tesseract', '--version'], 
-                                  capture_output=True, text=True)
-            version = result.stdout.split('\n')[0] if result.stdout else 'Unknown'
+            _, stdout = _run_tesseract('--version')
+            version = stdout.split('\n')[0] if stdout else 'Unknown'
             
             return {
                 'engine': 'tesseract',
@@ -183,12 +280,10 @@ class TesseractEngine:
     def _get_supported_languages(self) -> list:
         """Get list of supported languages"""
         try:
-            import subprocess
-            result = subprocess.run(['tesseract', '--list-langs'], 
-                                  capture_output=True, text=True)
+            returncode, stdout = _run_tesseract('--list-langs')
             
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')[1:]  # Skip header
+            if returncode == 0:
+                lines = stdout.strip().split('\n')[1:]  # Skip header
                 return [lang.strip() for lang in lines if lang.strip()]
             else:
                 return ['eng']  # Default to English
@@ -3,20 +3,138 @@ Main parsing pipeline for invoice processing
 Orchestrates OCR → Text Preprocessing → LLM Extraction → Validation
 """
 
-import json
+import re
+import copy
+import time
+import asyncio
+import hashlib
+import functools
 import structlog
-from typing import Dict, Any, Optional, Tuple
+import fastjsonschema
+from typing import Dict, Any, Optional, Tuple, AsyncIterator, List, Sequence, Union
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 
 from modules.ocr.engine import OCREngine
 from modules.llm.client import LLMFactory
+from modules.llm.batcher import RequestBatcher
+from modules.llm.cache import LLMCache
+from modules.llm import _json
 from modules.parsing.validators.price_validator import PriceValidator
-from modules.parsing.validators.duplicate_validator import DuplicateValidator
+from modules.parsing.validators.duplicate_validator import get_duplicate_validator
 from app.config import settings
 
 logger = structlog.get_logger()
 
+_WHITESPACE_RE = re.compile(r'\s+')
+# Single-character OCR mistakes, limited to glyphs never valid in invoice text;
+# digits are left alone so amounts, dates and invoice numbers reach the LLM intact
+_OCR_FIXES = str.maketrans({'|': 'I'})
+_CURRENCY_RE = re.compile(r'[$,\s]')
+
+# Cheap gate in front of the LLM: OCR output this short, or without both a digit and
+# an invoice marker, is a blank page or some other document and not worth a call
+MIN_INVOICE_TEXT_CHARS = 50
+_PAGE_MARKER_RE = re.compile(r'--- Page \d+ ---')  # Added by the OCR engine for PDFs
+_DIGIT_RE = re.compile(r'\d')
+_INVOICE_MARKER_RE = re.compile(r'[$€£]|total|invoice|amount', re.IGNORECASE)
+
+
+def _looks_like_invoice(text: str) -> bool:
+    """Heuristic check that OCR text could be an invoice"""
+    text = _PAGE_MARKER_RE.sub('', text).strip()
+    return (len(text) >= MIN_INVOICE_TEXT_CHARS
+            and _DIGIT_RE.search(text) is not None
+            and _INVOICE_MARKER_RE.search(text) is not None)
+
+
+# _ocr_step -> _llm_step: (raw_text, ocr_confidence, processed_text, started_at, digest, cached, invoice_id)
+_OCRState = Tuple[str, float, Optional[str], float, Optional[str], Optional[Tuple[Dict[str, Any], float]],
+                  Optional[int]]
+# _llm_step -> _finalize_result: (raw_text, ocr_confidence, parsed_data, llm_confidence, started_at, cached, invoice_id)
+_ExtractionState = Tuple[str, float, Dict[str, Any], float, float, bool, Optional[int]]
+
+
+def _file_digest(file_path: str) -> str:
+    """Content hash of a file, so re-uploads of the same invoice share a cache key"""
+    digest = hashlib.blake2b()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _to_money(value: Any) -> Optional[float]:
+    """Parse an amount like "$1,234.50" (or a number) as float"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(_CURRENCY_RE.sub('', str(value)))
+
+
+def _to_qty(value: Any) -> float:
+    """Parse a quantity, defaulting to 1 for non-numeric values like "I" (OCR artifact)"""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 1.0
+
+
+# Expected JSON shape, shown to the LLM as part of the extraction prompt
+EXTRACTION_SCHEMA = {
+    "vendor_name": "string",
+    "invoice_number": "string", 
+    "invoice_date": "YYYY-MM-DD",
+    "due_date": "YYYY-MM-DD or null",
+    "items": [
+        {
+            "description": "string",
+            "quantity": "number (not string)",
+            "unit_price": "number (not string)",
+            "total": "number (not string)"
+        }
+    ],
+    "subtotal": "number (not string)",
+    "tax": "number (not string)",
+    "total": "number (not string)"
+}
+
+# Shape an LLM reply must have to be accepted; compiled once into _validate_invoice
+INVOICE_SCHEMA = {
+    "type": "object",
+    "required": ["vendor_name", "invoice_number", "invoice_date", "total"],
+    "properties": {
+        "vendor_name": {"$ref": "#/definitions/present"},
+        "invoice_number": {"$ref": "#/definitions/present"},
+        "invoice_date": {"$ref": "#/definitions/present"},
+        "total": {"$ref": "#/definitions/present"},
+        # Only checked when items is a list
+        "items": {
+            "items": {"type": "object", "required": ["description", "total"]}
+        }
+    },
+    "definitions": {
+        # Any truthy value
+        "present": {"not": {"enum": [None, "", 0, False, [], {}]}}
+    }
+}
+
+# Generated Python specialized to the schema; raises JsonSchemaException on mismatch
+_validate_invoice = fastjsonschema.compile(INVOICE_SCHEMA)
+
+# Static instructions come first so the prefix is shared across invoices and
+# only the OCR text varies; rendered once at import. The schema itself is left
+# out: structured calls carry it separately (Ollama's system block and format,
+# Gemini's response_schema, the batcher's header), so it is prefilled once
+EXTRACTION_PROMPT_PREFIX = """Extract invoice data as JSON.
+
+INVOICE TEXT:
+"""
+EXTRACTION_PROMPT_SUFFIX = "\n\nPlease extract structured data from this invoice."
+# Plain streaming has no schema channel, so its prompt states the schema up front
+STREAM_PROMPT_PREFIX = _json.structured_instructions(EXTRACTION_SCHEMA) + "\n\n" + EXTRACTION_PROMPT_PREFIX
+
 class InvoiceParsingPipeline:
     """Main invoice parsing pipeline"""
     
@@ -28,86 +146,280 @@ class InvoiceParsingPipeline:
             self.llm_client = LLMFactory.create_client(llm_provider, llm_model)
         else:
             self.llm_client = LLMFactory.create_client(settings.LLM_PROVIDER, settings.LLM_MODEL)
+        
+        # Optional request coalescing for concurrent extractions (batch parsing)
+        self.batcher = None
+        if settings.LLM_BATCH_SIZE > 1:
+            self.batcher = RequestBatcher(self.llm_client, settings.LLM_BATCH_SIZE,
+                                          settings.LLM_BATCH_INTERVAL_MS / 1000)
             
+        # File digest -> (raw_text, ocr_confidence, parsed_data, llm_confidence), so a
+        # re-uploaded invoice skips OCR and the LLM; validation still runs on every parse
+        self.extraction_cache = LLMCache(settings.PARSE_CACHE_SIZE)
+        
         self.price_validator = PriceValidator()
-        self.duplicate_validator = DuplicateValidator()
+        self.duplicate_validator = get_duplicate_validator()
         
-    async def parse_invoice(self, file_path: str) -> Dict[str, Any]:
+    async def parse_invoice(self, file_path: str, invoice_id: Optional[int] = None) -> Dict[str, Any]:
         """
         Parse invoice from file path
+        invoice_id is the stored invoice being parsed, excluded from its own duplicate checks
         Returns: Parsed invoice data with confidence scores
         """
-        print("🚀 [DEBUG] Starting invoice parsing for:", file_path)
         logger.info(f"Starting invoice parsing for {file_path}")
         
         try:
-            # Step 1: OCR Processing
-            print("🔍 [DEBUG] Starting OCR extraction...")
+            # Steps 1-2: OCR Processing and Text Preprocessing
+            state = await self._ocr_step(file_path, invoice_id)
+            if isinstance(state, dict):
+                return state
+            
+            # Step 3: LLM Extraction
+            state = await self._llm_step(state)
+            if isinstance(state, dict):
+                return state
+            
+            # Steps 4-6: Type conversion, validation and final result
+            return await self._finalize_result(*state)
+            
+        except Exception as e:
+            logger.error(f"Invoice parsing failed: {e}", exc_info=True)
+            return self._pipeline_failure(e)
+    
+    @staticmethod
+    def _pipeline_failure(error: Exception) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': 'Pipeline processing failed',
+            'details': str(error)
+        }
+    
+    @staticmethod
+    def _not_an_invoice(ocr_confidence: float) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'error': 'Text does not appear to be an invoice',
+            'ocr_confidence': ocr_confidence
+        }
+    
+    async def _ocr_step(self, file_path: str, invoice_id: Optional[int] = None) -> Union[Dict[str, Any], _OCRState]:
+        """
+        OCR a file; returns an _OCRState or a failure result
+        The state's cached slot holds (parsed_data, llm_confidence) when this file was
+        extracted before, in which case OCR is skipped
+        """
+        started_at = time.perf_counter()
+        digest = await self._cache_key(file_path)
+        cached = self.extraction_cache.get(digest) if digest else None
+        if cached is not None:
+            raw_text, ocr_confidence, parsed_data, llm_confidence = cached
+            logger.debug("extraction_cache_hit", file_path=file_path)
+            return (raw_text, ocr_confidence, None, started_at, digest, (copy.deepcopy(parsed_data), llm_confidence),
+                    invoice_id)
+        
+        ocr_result = await self._extract_text(file_path)
+        if not ocr_result['success']:
+            logger.debug("ocr_failed", file_path=file_path, error=ocr_result.get('error'))
+            return {
+                'success': False,
+                'error': 'OCR extraction failed',
+                'details': ocr_result.get('error')
+            }
+        
+        raw_text = ocr_result['text']
+        logger.debug("ocr_extracted", file_path=file_path, confidence=ocr_result['confidence'],
+                     text_preview=raw_text[:200])
+        if not _looks_like_invoice(raw_text):
+            return self._not_an_invoice(ocr_result['confidence'])
+        return (raw_text, ocr_result['confidence'], self._preprocess_text(raw_text), started_at, digest, None,
+                invoice_id)
+    
+    async def _llm_step(self, state: _OCRState) -> Union[Dict[str, Any], _ExtractionState]:
+        """Extract structured data; returns _finalize_result arguments or a failure result"""
+        raw_text, ocr_confidence, processed_text, started_at, digest, cached, invoice_id = state
+        if cached is not None:
+            parsed_data, llm_confidence = cached
+            return raw_text, ocr_confidence, parsed_data, llm_confidence, started_at, True, invoice_id
+        
+        llm_result = await self._extract_structured_data(processed_text)
+        if not llm_result['success']:
+            return {
+                'success': False,
+                'error': 'LLM extraction failed',
+                'details': llm_result.get('error')
+            }
+        if digest:
+            # Copied because _finalize_result converts parsed_data in place
+            self.extraction_cache.set(digest, (raw_text, ocr_confidence, copy.deepcopy(llm_result['data']),
+                                               llm_result['confidence']))
+        return raw_text, ocr_confidence, llm_result['data'], llm_result['confidence'], started_at, False, invoice_id
+    
+    async def parse_invoices_batch(self, file_paths: Sequence[str],
+                                   max_concurrency: Optional[int] = None,
+                                   invoice_ids: Optional[Sequence[Optional[int]]] = None) -> List[Dict[str, Any]]:
+        """
+        Parse several invoices concurrently, with at most max_concurrency LLM
+        extractions in flight (default PARSE_BATCH_CONCURRENCY)
+        Results are in input order and match parse_invoice()
+        """
+        return await self.run_pipelined(file_paths, llm_workers=max_concurrency, invoice_ids=invoice_ids)
+    
+    async def run_pipelined(self, file_paths: Sequence[str], ocr_workers: int = 2,
+                            llm_workers: Optional[int] = None, validation_workers: int = 2,
+                            invoice_ids: Optional[Sequence[Optional[int]]] = None) -> List[Dict[str, Any]]:
+        """
+        Parse invoices with OCR, LLM extraction and validation as separate worker pools
+        connected by bounded queues, so one invoice's OCR overlaps another's LLM call
+        and throughput follows the slowest stage rather than the sum of all three
+        invoice_ids, aligned with file_paths, are passed on as in parse_invoice()
+        Results are in input order and match parse_invoice()
+        """
+        llm_workers = llm_workers or settings.PARSE_BATCH_CONCURRENCY
+        results: List[Optional[Dict[str, Any]]] = [None] * len(file_paths)
+        
+        # Bounded downstream queues apply backpressure to the faster stages
+        ocr_queue: asyncio.Queue = asyncio.Queue()
+        llm_queue: asyncio.Queue = asyncio.Queue(maxsize=llm_workers * 2)
+        validation_queue: asyncio.Queue = asyncio.Queue(maxsize=validation_workers * 2)
+        invoice_ids = invoice_ids or [None] * len(file_paths)
+        for item in enumerate(zip(file_paths, invoice_ids)):
+            ocr_queue.put_nowait(item)
+        for _ in range(ocr_workers):
+            ocr_queue.put_nowait(None)
+        
+        async def run_stage(step, workers: int, inbox: asyncio.Queue,
+                            outbox: Optional[asyncio.Queue], outbox_workers: int):
+            async def worker():
+                # None marks the end of the stage's input
+                while (item := await inbox.get()) is not None:
+                    index, payload = item
+                    try:
+                        state = await step(payload)
+                    except Exception as e:
+                        logger.error(f"Invoice parsing failed: {e}", exc_info=True)
+                        results[index] = self._pipeline_failure(e)
+                        continue
+                    if isinstance(state, dict):
+                        results[index] = state  # Final result, success or failure
+                    else:
+                        await outbox.put((index, state))
+            
+            await asyncio.gather(*(worker() for _ in range(workers)))
+            if outbox is not None:
+                for _ in range(outbox_workers):
+                    await outbox.put(None)
+        
+        await asyncio.gather(
+            run_stage(lambda job: self._ocr_step(*job), ocr_workers, ocr_queue, llm_queue, llm_workers),
+            run_stage(self._llm_step, llm_workers, llm_queue, validation_queue, validation_workers),
+            run_stage(lambda state: self._finalize_result(*state), validation_workers,
+                      validation_queue, None, 0),
+        )
+        return results
+    
+    async def stream_parse(self, file_path: str, invoice_id: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Parse invoice from file path, streaming progress as it happens (invoice_id as in parse_invoice())
+        Yields: 'ocr' event, 'token' events as the LLM decodes, then one 'result' event
+        whose payload matches parse_invoice()
+        """
+        logger.info(f"Starting streamed invoice parsing for {file_path}")
+        
+        try:
+            started_at = time.perf_counter()
             ocr_result = await self._extract_text(file_path)
-            print("🔍 [DEBUG] OCR result:", ocr_result)
             if not ocr_result['success']:
-                print("❌ [DEBUG] OCR failed:", ocr_result.get('error'))
-                return {
+                yield {
+                    'event': 'result',
                     'success': False,
                     'error': 'OCR extraction failed',
                     'details': ocr_result.get('error')
                 }
+                return
             
             raw_text = ocr_result['text']
             ocr_confidence = ocr_result['confidence']
-            print("🔍 [DEBUG] OCR extracted text:\n", raw_text[:1000])
+            if not _looks_like_invoice(raw_text):
+                yield {'event': 'result', **self._not_an_invoice(ocr_confidence)}
+                return
+            yield {'event': 'ocr', 'confidence': ocr_confidence, 'characters': len(raw_text)}
             
-            # Step 2: Text Preprocessing
-            processed_text = self._preprocess_text(raw_text)
+            prompt = self._build_prompt(self._preprocess_text(raw_text), stream=True)
+            chunks = []
+            async for token in self.llm_client.stream(prompt):
+                chunks.append(token)
+                yield {'event': 'token', 'text': token}
             
-            # Step 3: LLM Extraction
-            print("🤖 [DEBUG] LLM prompt/input:\n", processed_text[:1000])
-            llm_result = await self._extract_structured_data(processed_text)
-            if not llm_result['success']:
-                return {
+            parsed_data = self._parse_streamed_json(''.join(chunks))
+            if parsed_data is None or not self._validate_parsed_data(parsed_data):
+                yield {
+                    'event': 'result',
                     'success': False,
                     'error': 'LLM extraction failed',
-                    'details': llm_result.get('error')
+                    'details': 'Invalid data structure returned by LLM'
                 }
+                return
             
-            parsed_data = llm_result['data']
-            llm_confidence = llm_result['confidence']
-            
-            # Convert data types (strings to numbers)
-            parsed_data = self._convert_data_types(parsed_data)
-            
-            # Step 4: Data Validation
-            validation_result = await self._validate_data(parsed_data)
-            
-            # Step 5: Calculate overall confidence
-            overall_confidence = (ocr_confidence + llm_confidence) / 2
-            
-            # Step 6: Prepare final result
-            result = {
-                'success': True,
-                'raw_text': raw_text,
-                'parsed_data': parsed_data,
-                'confidence_score': overall_confidence,
-                'ocr_confidence': ocr_confidence,
-                'llm_confidence': llm_confidence,
-                'validation_alerts': validation_result['alerts'],
-                'processing_time': datetime.utcnow().isoformat()
-            }
-            
-            logger.info(f"Invoice parsing completed successfully", 
-                       confidence=overall_confidence,
-                       vendor=parsed_data.get('vendor_name'))
-            
-            return result
+            result = await self._finalize_result(raw_text, ocr_confidence, parsed_data, 0.9, started_at,
+                                                 invoice_id=invoice_id)
+            yield {'event': 'result', **result}
             
         except Exception as e:
-            logger.error(f"Invoice parsing failed: {e}", exc_info=True)
-            return {
+            logger.error(f"Streamed invoice parsing failed: {e}", exc_info=True)
+            yield {
+                'event': 'result',
                 'success': False,
                 'error': 'Pipeline processing failed',
                 'details': str(e)
             }
     
+    async def _finalize_result(self, raw_text: str, ocr_confidence: float,
+                               parsed_data: Dict[str, Any], llm_confidence: float,
+                               started_at: float, cached: bool = False,
+                               invoice_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Convert types, run validators and assemble the pipeline result
+        started_at is the time.perf_counter() reading taken when OCR began; cached marks
+        an extraction reused from an earlier parse of the same file
+        """
+        # Convert data types (strings to numbers)
+        parsed_data = self._convert_data_types(parsed_data)
+        
+        # Data Validation
+        validation_result = await self._validate_data(parsed_data, invoice_id)
+        
+        # Calculate overall confidence
+        overall_confidence = (ocr_confidence + llm_confidence) / 2
+        
+        # Prepare final result
+        result = {
+            'success': True,
+            'raw_text': raw_text,
+            'parsed_data': parsed_data,
+            'confidence_score': overall_confidence,
+            'ocr_confidence': ocr_confidence,
+            'llm_confidence': llm_confidence,
+            'validation_alerts': validation_result['alerts'],
+            'cached': cached,
+            'processing_time_ms': (time.perf_counter() - started_at) * 1000,
+            'completed_at': datetime.now(timezone.utc).isoformat()
+        }
+        
+        logger.info(f"Invoice parsing completed successfully", 
+                   confidence=overall_confidence,
+                   vendor=parsed_data.get('vendor_name'))
+        
+        return result
+    
+    async def _cache_key(self, file_path: str) -> Optional[str]:
+        """Content hash for the extraction cache, or None when caching is off or the file is unreadable"""
+        if settings.PARSE_CACHE_SIZE <= 0:
+            return None
+        try:
+            return await asyncio.to_thread(_file_digest, file_path)
+        except OSError:
+            return None  # Let OCR report the problem
+    
     async def _extract_text(self, file_path: str) -> Dict[str, Any]:
         """Extract text from invoice using OCR"""
         try:
@@ -119,51 +431,37 @@ class InvoiceParsingPipeline:
     
     def _preprocess_text(self, text: str) -> str:
         """Preprocess OCR text for better LLM extraction"""
-        # Remove extra whitespace
-        text = ' '.join(text.split())
-        
-        # Remove common OCR artifacts
-        text = text.replace('|', 'I')  # Common OCR mistake
-        text = text.replace('0', 'O')  # Context-dependent
-        
-        # Add structure hints
-        text = f"INVOICE TEXT:\n{text}\n\nPlease extract structured data from this invoice."
-        
-        return text
+        # Collapse whitespace and fix common OCR artifacts in one pass each
+        return _WHITESPACE_RE.sub(' ', text).translate(_OCR_FIXES).strip()
+    
+    def _build_prompt(self, text: str, stream: bool = False) -> str:
+        """
+        Build the LLM extraction prompt for preprocessed invoice text
+        stream=True adds the schema, for plain (non-structured) streaming calls
+        """
+        # Both halves are precomputed; per call this is a single concatenation
+        prefix = STREAM_PROMPT_PREFIX if stream else EXTRACTION_PROMPT_PREFIX
+        return prefix + text + EXTRACTION_PROMPT_SUFFIX
+    
+    def _parse_streamed_json(self, response_text: str) -> Optional[Dict[str, Any]]:
+        """Extract the JSON object from a streamed LLM response"""
+        try:
+            return _json.extract_json_object(response_text)
+        except ValueError:
+            return None
     
     async def _extract_structured_data(self, text: str) -> Dict[str, Any]:
         """Extract structured data using LLM"""
         try:
-            # Define the expected JSON schema
-            schema = {
-                "vendor_name": "string",
-                "invoice_number": "string", 
-                "invoice_date": "YYYY-MM-DD",
-                "due_date": "YYYY-MM-DD or null",
-                "items": [
-                    {
-                        "description": "string",
-                        "quantity": "number (not string)",
-                        "unit_price": "number (not string)",
-                        "total": "number (not string)"
-                    }
-                ],
-                "subtotal": "number (not string)",
-                "tax": "number (not string)",
-                "total": "number (not string)"
-            }
-            
             # Create optimized prompt
-            prompt = f"""Extract invoice data as JSON:
-
-{text}
-
-Return ONLY valid JSON matching this schema (no other text):
-{json.dumps(schema, indent=2)}"""
+            prompt = self._build_prompt(text)
             
             # Use LLM to extract structured data
-            response = self.llm_client.generate_structured(prompt, schema)
-            print("🤖 [DEBUG] LLM output:\n", response)
+            if self.batcher is not None:
+                response = await self.batcher.submit(prompt, EXTRACTION_SCHEMA)
+            else:
+                response = await self.llm_client.agenerate_structured(prompt, EXTRACTION_SCHEMA)
+            logger.debug("llm_extracted", response=response)
             
             # Validate the response structure
             if self._validate_parsed_data(response):
@@ -184,74 +482,58 @@ Return ONLY valid JSON matching this schema (no other text):
     
     def _validate_parsed_data(self, data: Dict[str, Any]) -> bool:
         """Validate the structure of parsed data"""
-        required_fields = ['vendor_name', 'invoice_number', 'invoice_date', 'total']
-        
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return False
-        
-        # Validate items structure
-        if 'items' in data and isinstance(data['items'], list):
-            for item in data['items']:
-                if not isinstance(item, dict):
-                    return False
-                if 'description' not in item or 'total' not in item:
-                    return False
-        
+        try:
+            _validate_invoice(data)
+        except fastjsonschema.JsonSchemaException:
+            return False
         return True
     
     def _convert_data_types(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Convert string values to appropriate data types"""
         try:
             # Convert numeric fields
-            if 'total' in data and data['total']:
-                data['total'] = float(str(data['total']).replace('$', '').replace(',', ''))
-            if 'subtotal' in data and data['subtotal']:
-                data['subtotal'] = float(str(data['subtotal']).replace('$', '').replace(',', ''))
-            if 'tax' in data and data['tax']:
-                data['tax'] = float(str(data['tax']).replace('$', '').replace(',', ''))
+            for field in ('total', 'subtotal', 'tax'):
+                if data.get(field):
+                    data[field] = _to_money(data[field])
             
             # Convert item fields
             if 'items' in data and isinstance(data['items'], list):
                 for item in data['items']:
-                    if 'quantity' in item and item['quantity']:
-                        # Handle non-numeric quantities like "I" (OCR artifact)
-                        try:
-                            item['quantity'] = float(item['quantity'])
-                        except (ValueError, TypeError):
-                            item['quantity'] = 1.0  # Default to 1 if can't parse
-                    
-                    if 'unit_price' in item and item['unit_price']:
-                        item['unit_price'] = float(str(item['unit_price']).replace('$', '').replace(',', ''))
-                    
-                    if 'total' in item and item['total']:
-                        item['total'] = float(str(item['total']).replace('$', '').replace(',', ''))
+                    if item.get('quantity'):
+                        item['quantity'] = _to_qty(item['quantity'])
+                    for field in ('unit_price', 'total'):
+                        if item.get(field):
+                            item[field] = _to_money(item[field])
             
             return data
         except Exception as e:
             logger.error(f"Data type conversion failed: {e}")
             return data  # Return original data if conversion fails
     
-    async def _validate_data(self, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Validate extracted data and generate alerts"""
+    async def _validate_data(self, parsed_data: Dict[str, Any], invoice_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Validate extracted data and generate alerts
+        Price alerts stay PriceAlert objects and the others are dicts; both serialize
+        to the same JSON shape
+        """
         alerts = []
         
-        try:
-            # Price validation
-            price_alerts = await self.price_validator.validate(parsed_data)
-            alerts.extend(price_alerts)
-            
-            # Duplicate validation
-            duplicate_alerts = await self.duplicate_validator.validate(parsed_data)
-            alerts.extend(duplicate_alerts)
-            
-        except Exception as e:
-            logger.error(f"Data validation failed: {e}")
-            alerts.append({
-                'type': 'validation_error',
-                'message': f'Validation process failed: {str(e)}',
-                'severity': 'high'
-            })
+        # Validators only read parsed_data, so their DB lookups can overlap
+        outcomes = await asyncio.gather(
+            self.price_validator.validate(parsed_data, invoice_id),
+            self.duplicate_validator.validate(parsed_data, invoice_id),
+            return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                logger.error(f"Data validation failed: {outcome}")
+                alerts.append({
+                    'type': 'validation_error',
+                    'message': f'Validation process failed: {str(outcome)}',
+                    'severity': 'high'
+                })
+            else:
+                alerts.extend(outcome)
         
         return {'alerts': alerts}
     
@@ -260,8 +542,26 @@ Return ONLY valid JSON matching this schema (no other text):
         return {
             'ocr_engine': self.ocr_engine.get_stats(),
             'llm_provider': self.llm_client.__class__.__name__,
+            'extraction_cache': self.extraction_cache.get_stats(),
             'validators': [
                 'price_validator',
                 'duplicate_validator'
             ]
-        } 
\ No newline at end of file
+        }
+
+
+def get_pipeline(llm_provider: str = None, llm_model: str = None) -> InvoiceParsingPipeline:
+    """
+    Return the process-wide pipeline for a provider/model pair
+    Construction (OCR engines, LLM client, validators) is paid once, not per request
+    """
+    # Resolve defaults first so an explicit request for the configured
+    # provider shares the default instance instead of building a twin
+    if not llm_provider:
+        llm_provider, llm_model = settings.LLM_PROVIDER, settings.LLM_MODEL
+    return _cached_pipeline(llm_provider, llm_model)
+
+
+@functools.lru_cache(maxsize=8)
+def _cached_pipeline(llm_provider: str, llm_model: Optional[str]) -> InvoiceParsingPipeline:
+    return InvoiceParsingPipeline(llm_provider=llm_provider, llm_model=llm_model)
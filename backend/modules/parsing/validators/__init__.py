@@ -1 +1,7 @@
-# Validators module 
\ No newline at end of file
+# Validators module
+
+
+def default_session_factory():
+    """Open a database session; imported lazily so validators can be built without a database engine"""
+    from app.database import SessionLocal
+    return SessionLocal()
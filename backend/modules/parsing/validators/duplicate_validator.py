@@ -3,21 +3,31 @@ Duplicate validation module
 Checks for duplicate invoice numbers and similar invoices
 """
 
+import asyncio
+import functools
 import structlog
-from typing import Dict, Any, List
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+from decimal import Decimal
+from datetime import date, datetime
+
+from modules.parsing.validators import default_session_factory
 
 logger = structlog.get_logger()
 
+# Recorded invoices whose similar-invoice details are returned
+SIMILAR_INVOICES_LIMIT = 10
+
+
 class DuplicateValidator:
-    """Validates invoices for duplicates"""
+    """Validates invoices for duplicates against stored invoices"""
     
-    def __init__(self):
-        self.processed_invoices = set()  # In-memory cache, should be replaced with DB
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self.session_factory = session_factory or default_session_factory
     
-    async def validate(self, parsed_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def validate(self, parsed_data: Dict[str, Any], invoice_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Validate for duplicate invoices
+        invoice_id is the stored invoice being (re-)parsed, which never counts as its own duplicate
         Returns: List of alerts for duplicates
         """
         alerts = []
@@ -37,7 +47,7 @@ class DuplicateValidator:
                 return alerts
             
             # Check for exact duplicate invoice number
-            if await self._is_duplicate_invoice_number(invoice_number, vendor_name):
+            if await self._is_duplicate_invoice_number(invoice_number, vendor_name, invoice_id):
                 alerts.append({
                     'type': 'duplicate_invoice_number',
                     'message': f'Duplicate invoice number detected: {invoice_number}',
@@ -49,7 +59,7 @@ class DuplicateValidator:
                 })
             
             # Check for similar invoices (same vendor, date, and total)
-            similar_invoices = await self._find_similar_invoices(vendor_name, invoice_date, total)
+            similar_invoices = await self._find_similar_invoices(vendor_name, invoice_date, total, invoice_id)
             if similar_invoices:
                 alerts.append({
                     'type': 'similar_invoice',
@@ -63,9 +73,6 @@ class DuplicateValidator:
                     }
                 })
             
-            # Add to processed invoices
-            self._add_processed_invoice(invoice_number, vendor_name, invoice_date, total)
-            
             logger.info(f"Duplicate validation completed for {vendor_name}", 
                        alerts_count=len(alerts))
             
@@ -79,38 +86,77 @@ class DuplicateValidator:
                 'severity': 'high'
             }]
     
-    async def _is_duplicate_invoice_number(self, invoice_number: str, vendor_name: str) -> bool:
-        """
-        Check if invoice number already exists for this vendor
-        TODO: Replace with actual database query
-        """
-        # This is a placeholder - should query the database
-        # For now, check in-memory cache
-        key = f"{vendor_name}:{invoice_number}"
-        return key in self.processed_invoices
+    async def _is_duplicate_invoice_number(self, invoice_number: str, vendor_name: str,
+                                           invoice_id: Optional[int] = None) -> bool:
+        """Check if invoice number already exists for this vendor"""
+        try:
+            return await asyncio.to_thread(self._stored_invoice_exists, str(invoice_number), vendor_name, invoice_id)
+        except Exception as e:
+            logger.warning(f"Duplicate lookup failed: {e}")
+            return False
     
-    async def _find_similar_invoices(self, vendor_name: str, invoice_date: str, total: float) -> List[Dict[str, Any]]:
-        """
-        Find similar invoices (same vendor, date, and similar total)
-        TODO: Replace with actual database query
-        """
-        # This is a placeholder - should query the database
-        # For now, return empty list
-        return []
+    def _stored_invoice_exists(self, invoice_number: str, vendor_name: str, invoice_id: Optional[int]) -> bool:
+        from app.core.models.invoice import Invoice
+        
+        db = self.session_factory()
+        try:
+            # Served by ix_invoices_parsed_vendor_number
+            query = db.query(Invoice.id).filter(
+                Invoice.parsed_vendor_name == vendor_name,
+                Invoice.parsed_invoice_number == invoice_number
+            )
+            if invoice_id is not None:
+                query = query.filter(Invoice.id != invoice_id)
+            return query.limit(1).first() is not None
+        finally:
+            db.close()
     
-    def _add_processed_invoice(self, invoice_number: str, vendor_name: str, 
-                             invoice_date: str, total: float):
-        """Add invoice to processed set (for testing purposes)"""
-        key = f"{vendor_name}:{invoice_number}"
-        self.processed_invoices.add(key)
+    async def _find_similar_invoices(self, vendor_name: str, invoice_date: str, total: float,
+                                     invoice_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Find stored invoices with the same vendor, date and total (to the cent)"""
+        try:
+            day = invoice_date if isinstance(invoice_date, date) else date.fromisoformat(str(invoice_date))
+            amount = Decimal(str(round(float(total), 2)))
+        except (TypeError, ValueError):
+            return []  # Nothing comparable to match on
+        
+        try:
+            return await asyncio.to_thread(self._stored_similar_invoices, vendor_name, day, amount, invoice_id)
+        except Exception as e:
+            logger.warning(f"Similar invoice lookup failed: {e}")
+            return []
+    
+    def _stored_similar_invoices(self, vendor_name: str, day: date, amount: Decimal,
+                                 invoice_id: Optional[int]) -> List[Dict[str, Any]]:
+        from app.core.models.invoice import Invoice
+        
+        db = self.session_factory()
+        try:
+            # Served by ix_invoices_parsed_vendor_date; total is checked on those rows
+            query = db.query(Invoice.id, Invoice.parsed_invoice_number).filter(
+                Invoice.parsed_vendor_name == vendor_name,
+                Invoice.invoice_date == day,
+                Invoice.total == amount
+            )
+            if invoice_id is not None:
+                query = query.filter(Invoice.id != invoice_id)
+            rows = query.limit(SIMILAR_INVOICES_LIMIT).all()
+            return [{'id': stored_id, 'invoice_number': number} for stored_id, number in rows]
+        finally:
+            db.close()
     
     def get_validation_stats(self) -> Dict[str, Any]:
         """Get validation statistics"""
         return {
-            'processed_invoices_count': len(self.processed_invoices),
             'validator_type': 'duplicate_validator'
         }
-    
-    def clear_cache(self):
-        """Clear the processed invoices cache (for testing)"""
-        self.processed_invoices.clear() 
\ No newline at end of file
+
+
+@functools.lru_cache(maxsize=None)
+def get_duplicate_validator() -> DuplicateValidator:
+    """
+    Return the process-wide duplicate validator
+    Every pipeline shares it; duplicates are looked up in the database, so
+    invoices stored by other workers are always seen
+    """
+    return DuplicateValidator()
@@ -3,38 +3,178 @@ Price validation module
 Checks for price discrepancies and unusual pricing patterns
 """
 
+import time
+import asyncio
 import structlog
-from typing import Dict, Any, List
-from decimal import Decimal
-from datetime import datetime, timedelta
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from modules.parsing.validators import default_session_factory
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - numba is optional
+    njit = None
 
 logger = structlog.get_logger()
 
+# Unit prices and invoice totals above these are flagged for review
+UNUSUAL_UNIT_PRICE = 100
+HIGH_INVOICE_TOTAL = 10000
+# Allowed gap between total and subtotal + tax, for rounding
+TOTAL_TOLERANCE = 0.01
+# Price changes of at least this fraction are high severity
+MAJOR_PRICE_CHANGE = 0.2
+
+# _score_prices codes
+PRICE_UNCHANGED, PRICE_CHANGED, PRICE_CHANGED_MAJOR = 0, 1, 2
+
+
+def _as_price(value: Any) -> float:
+    """Price as float, or NaN when missing, zero or not a number"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value:
+        return float(value)
+    return np.nan
+
+
+def _as_amount(value: Any) -> float:
+    """Amount as float (zero allowed), or NaN when it is not a number"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+
+def _score_prices_loop(prices: np.ndarray, historical: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Score each price against its historical price (NaN where unknown) as a PRICE_* code
+    Written as a plain loop so Numba compiles it to one fused pass without temporaries
+    """
+    scores = np.zeros(prices.size, dtype=np.uint8)
+    for i in range(prices.size):
+        old = historical[i]
+        if old > 0:
+            change = abs(prices[i] - old) / old
+            if change > threshold:
+                scores[i] = PRICE_CHANGED_MAJOR if change >= MAJOR_PRICE_CHANGE else PRICE_CHANGED
+    return scores
+
+
+def _score_prices_numpy(prices: np.ndarray, historical: np.ndarray, threshold: float) -> np.ndarray:
+    """NumPy equivalent of _score_prices_loop, used when Numba isn't installed"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.abs(prices - historical) / historical
+    changed = (historical > 0) & (change > threshold)
+    scores = changed.astype(np.uint8)
+    scores[changed & (change >= MAJOR_PRICE_CHANGE)] = PRICE_CHANGED_MAJOR
+    return scores
+
+
+# cache=True keeps the compiled kernel in __pycache__ across restarts; no parallel=True,
+# since invoices have tens of items and thread startup would cost more than the loop
+_score_prices = njit(cache=True)(_score_prices_loop) if njit is not None else _score_prices_numpy
+
+
+def warm_up():
+    """
+    Compile the price kernels now (e.g. at deploy time) rather than on the first invoice
+    With Numba's on-disk cache, later processes load the compiled code instead of recompiling
+    """
+    _score_prices(np.zeros(1), np.zeros(1), 0.05)
+
+
+@dataclass(slots=True)
+class PriceAlert:
+    """
+    A single price or total alert; slotted, since batch runs build thousands of them
+    Kept as an object through the pipeline; orjson serializes dataclasses natively
+    when the result is returned
+    """
+    type: str
+    message: str
+    severity: str
+    details: Optional[Dict[str, Any]] = None
+
+
+# (price, id of the invoice the price was recorded on)
+_PriceEntry = Tuple[float, Optional[int]]
+
+
+class PriceCache:
+    """
+    LRU of (vendor_name, description) -> (last known price, id of the invoice it is from),
+    (NaN, None) when there is none
+    Entries expire after ttl seconds so prices recorded by other processes are picked up
+    """
+    
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[_PriceEntry, float]]" = OrderedDict()
+    
+    def get(self, key: Tuple[str, str]) -> Optional[_PriceEntry]:
+        """Return the cached (price, invoice_id) (price possibly NaN), or None if absent or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        price, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return price
+    
+    def set(self, key: Tuple[str, str], price: _PriceEntry):
+        """Store a (price, invoice_id) entry, evicting the least recently used one when full"""
+        if key in self._entries:
+            self._entries.move_to_end(key)  # New keys are appended at the end already
+        self._entries[key] = (price, time.monotonic() + self.ttl)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 class PriceValidator:
     """Validates invoice prices against historical data"""
     
-    def __init__(self, threshold: float = 0.05):  # 5% threshold
+    def __init__(self, threshold: float = 0.05, session_factory: Optional[Callable] = None):  # 5% threshold
         self.threshold = threshold
-        self.price_history = {}  # In-memory cache, should be replaced with DB
+        self.session_factory = session_factory or default_session_factory
+        # Recent lookups per vendor and item, so repeat invoices skip the database
+        self.price_history = PriceCache()
     
-    async def validate(self, parsed_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def validate(self, parsed_data: Dict[str, Any], invoice_id: Optional[int] = None) -> List[PriceAlert]:
         """
         Validate prices in parsed invoice data
+        invoice_id is the stored invoice being (re-)parsed, whose own earlier lines are not its history
         Returns: List of alerts for price discrepancies
         """
-        alerts = []
-        
         try:
             vendor_name = parsed_data.get('vendor_name', 'Unknown')
-            items = parsed_data.get('items', [])
+            items = [item for item in parsed_data.get('items') or [] if isinstance(item, dict)]
             
-            for item in items:
-                item_alerts = await self._validate_item_price(vendor_name, item)
-                alerts.extend(item_alerts)
+            item_alerts = []
+            if items:
+                descriptions = [item.get('description', 'Unknown Item') for item in items]
+                # Missing, zero or non-numeric prices are NaN and fail every comparison
+                prices = np.fromiter((_as_price(item.get('unit_price')) for item in items),
+                                     dtype=np.float64, count=len(items))
+                historical = None
+                # History is keyed by vendor and only compared against usable prices, so
+                # without either the lookup and the scoring pass are skipped
+                if parsed_data.get('vendor_name') and not np.isnan(prices).all():
+                    historical = await self._get_historical_prices(vendor_name, descriptions, invoice_id)
+                item_alerts = self._validate_item_prices(prices, descriptions, historical)
             
-            # Validate total amount
-            total_alerts = await self._validate_total_amount(parsed_data)
-            alerts.extend(total_alerts)
+            # Item and total alerts go into the result list in one pass
+            alerts = list(chain(item_alerts, self._validate_total_amount(parsed_data)))
             
             logger.info(f"Price validation completed for {vendor_name}", 
                        alerts_count=len(alerts))
@@ -43,122 +183,198 @@ class PriceValidator:
             
         except Exception as e:
             logger.error(f"Price validation failed: {e}")
-            return [{
-                'type': 'price_validation_error',
-                'message': f'Price validation process failed: {str(e)}',
-                'severity': 'high'
-            }]
+            return [PriceAlert(
+                type='price_validation_error',
+                message=f'Price validation process failed: {str(e)}',
+                severity='high'
+            )]
     
-    async def _validate_item_price(self, vendor_name: str, item: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Validate individual item price"""
-        alerts = []
+    def _validate_item_prices(self, prices: np.ndarray, descriptions: List[str],
+                              historical: Optional[np.ndarray]) -> List[PriceAlert]:
+        """
+        Validate item prices against historical prices (NaN where unknown, None when not looked up)
+        Every item is scored in one compiled or vectorized pass; Python only builds the alerts
+        """
+        if historical is None:
+            scores = np.zeros(prices.size, dtype=np.uint8)  # Only the unusual-price check applies
+        else:
+            scores = _score_prices(prices, historical, self.threshold)
+        unusual = prices > UNUSUAL_UNIT_PRICE
         
-        try:
-            description = item.get('description', 'Unknown Item')
-            unit_price = item.get('unit_price')
-            quantity = item.get('quantity', 1)
-            
-            if not unit_price:
-                return alerts
-            
-            # Get historical price for this item
-            historical_price = await self._get_historical_price(vendor_name, description)
+        alerts = []
+        for i in np.flatnonzero((scores != PRICE_UNCHANGED) | unusual):
+            description = descriptions[i]
+            unit_price = float(prices[i])
             
-            if historical_price:
-                price_change = abs(unit_price - historical_price) / historical_price
-                
-                if price_change > self.threshold:
-                    alerts.append({
-                        'type': 'price_discrepancy',
-                        'message': f'Price change detected for {description}: '
-                                 f'${historical_price:.2f} → ${unit_price:.2f} '
-                                 f'({price_change:.1%} change)',
-                        'severity': 'medium' if price_change < 0.2 else 'high',
-                        'details': {
-                            'item': description,
-                            'old_price': historical_price,
-                            'new_price': unit_price,
-                            'change_percentage': price_change
-                        }
-                    })
+            if scores[i] != PRICE_UNCHANGED:
+                historical_price = float(historical[i])
+                change = abs(unit_price - historical_price) / historical_price
+                alerts.append(PriceAlert(
+                    type='price_discrepancy',
+                    message=f'Price change detected for {description}: '
+                            f'${historical_price:.2f} → ${unit_price:.2f} '
+                            f'({change:.1%} change)',
+                    severity='high' if scores[i] == PRICE_CHANGED_MAJOR else 'medium',
+                    details={
+                        'item': description,
+                        'old_price': historical_price,
+                        'new_price': unit_price,
+                        'change_percentage': change
+                    }
+                ))
             
-            # Check for unusually high or low prices
-            if unit_price > 100:  # Arbitrary threshold
-                alerts.append({
-                    'type': 'unusual_price',
-                    'message': f'Unusually high unit price for {description}: ${unit_price:.2f}',
-                    'severity': 'low',
-                    'details': {
+            # Check for unusually high prices
+            if unusual[i]:
+                alerts.append(PriceAlert(
+                    type='unusual_price',
+                    message=f'Unusually high unit price for {description}: ${unit_price:.2f}',
+                    severity='low',
+                    details={
                         'item': description,
                         'price': unit_price,
-                        'threshold': 100
+                        'threshold': UNUSUAL_UNIT_PRICE
                     }
-                })
-            
-        except Exception as e:
-            logger.error(f"Item price validation failed: {e}")
+                ))
         
         return alerts
     
-    async def _validate_total_amount(self, parsed_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _validate_total_amount(self, parsed_data: Dict[str, Any]) -> List[PriceAlert]:
         """Validate total invoice amount"""
-        alerts = []
+        return self.validate_totals([parsed_data])[0]
+    
+    def validate_totals(self, invoices: List[Dict[str, Any]]) -> List[List[PriceAlert]]:
+        """
+        Validate total amounts of many invoices in one vectorized pass
+        Returns: one list of alerts per invoice, in input order
+        """
+        count = len(invoices)
+        # Invoices without a usable total get NaN and are skipped; a subtotal or tax that
+        # is present but not a number is NaN too and rules out the mismatch check
+        totals = np.fromiter((_as_price(invoice.get('total')) for invoice in invoices),
+                             dtype=np.float64, count=count)
+        subtotals = np.fromiter((_as_amount(invoice.get('subtotal', 0)) for invoice in invoices),
+                                dtype=np.float64, count=count)
+        taxes = np.fromiter((_as_amount(invoice.get('tax', 0)) for invoice in invoices),
+                            dtype=np.float64, count=count)
         
-        try:
-            total = parsed_data.get('total')
-            subtotal = parsed_data.get('subtotal', 0)
-            tax = parsed_data.get('tax', 0)
-            
-            if not total:
-                return alerts
+        calculated = subtotals + taxes
+        differences = np.abs(totals - calculated)
+        mismatched = differences > TOTAL_TOLERANCE
+        high = totals > HIGH_INVOICE_TOTAL
+        
+        alerts: List[List[PriceAlert]] = [[] for _ in range(count)]
+        for i in np.flatnonzero(mismatched | high):
+            total = float(totals[i])
             
             # Check if total matches subtotal + tax
-            calculated_total = subtotal + tax
-            if abs(total - calculated_total) > 0.01:  # Allow for rounding differences
-                alerts.append({
-                    'type': 'total_mismatch',
-                    'message': f'Total amount mismatch: calculated ${calculated_total:.2f} vs ${total:.2f}',
-                    'severity': 'medium',
-                    'details': {
+            if mismatched[i]:
+                calculated_total = float(calculated[i])
+                alerts[i].append(PriceAlert(
+                    type='total_mismatch',
+                    message=f'Total amount mismatch: calculated ${calculated_total:.2f} vs ${total:.2f}',
+                    severity='medium',
+                    details={
                         'calculated_total': calculated_total,
                         'invoice_total': total,
-                        'difference': abs(total - calculated_total)
+                        'difference': float(differences[i])
                     }
-                })
+                ))
             
             # Check for unusually high totals
-            if total > 10000:  # Arbitrary threshold
-                alerts.append({
-                    'type': 'high_total',
-                    'message': f'Unusually high invoice total: ${total:.2f}',
-                    'severity': 'low',
-                    'details': {
+            if high[i]:
+                alerts[i].append(PriceAlert(
+                    type='high_total',
+                    message=f'Unusually high invoice total: ${total:.2f}',
+                    severity='low',
+                    details={
                         'total': total,
-                        'threshold': 10000
+                        'threshold': HIGH_INVOICE_TOTAL
                     }
-                })
-            
-        except Exception as e:
-            logger.error(f"Total amount validation failed: {e}")
+                ))
         
         return alerts
     
-    async def _get_historical_price(self, vendor_name: str, item_description: str) -> float:
+    async def _get_historical_prices(self, vendor_name: str, descriptions: List[str],
+                                     invoice_id: Optional[int] = None) -> np.ndarray:
+        """
+        Get the last recorded price of each item from the same vendor, aligned with descriptions
+        Lines of invoice invoice_id are skipped; NaN marks items without history
+        """
+        last_prices: Dict[str, float] = {}
+        missing = []
+        for description in dict.fromkeys(descriptions):
+            entry = self.price_history.get((vendor_name, description))
+            # A price cached from this invoice's earlier parse is not its history
+            if entry is None or (invoice_id is not None and entry[1] == invoice_id):
+                missing.append(description)
+            else:
+                last_prices[description] = entry[0]
+        
+        if missing:
+            missing.sort()
+            try:
+                # One query for every uncached item rather than one per line item
+                latest, others = await asyncio.to_thread(self._stored_prices, vendor_name, missing, invoice_id)
+            except Exception as e:
+                logger.warning(f"Historical price lookup failed: {e}")
+                latest = others = None
+            for description in missing:
+                if latest is not None:
+                    # The newest line overall is cached (NaN caches "no history" too)
+                    self.price_history.set((vendor_name, description), latest.get(description, (np.nan, None)))
+                    last_prices[description] = others.get(description, np.nan)
+                else:
+                    last_prices[description] = np.nan
+        
+        return np.fromiter((last_prices[description] for description in descriptions),
+                           dtype=np.float64, count=len(descriptions))
+    
+    def _stored_prices(self, vendor_name: str, descriptions: List[str],
+                       invoice_id: Optional[int]) -> Tuple[Dict[str, _PriceEntry], Dict[str, float]]:
         """
-        Get historical price for an item from the same vendor
-        TODO: Replace with actual database query
+        Newest stored price per description for this vendor, as two maps: the newest line
+        overall as (price, invoice_id), for the cache, and the newest price from any
+        invoice other than invoice_id, for this validation
         """
-        # This is a placeholder - should query the database
-        # For now, return None to indicate no historical data
-        return None
+        from sqlalchemy import func
+        from app.core.models.invoice import Invoice, InvoiceItem
+        
+        db = self.session_factory()
+        try:
+            # Newest line per description, ranked separately for this invoice and all
+            # others, so at most two rows per description come back
+            partition = [InvoiceItem.description]
+            if invoice_id is not None:
+                partition.append(InvoiceItem.invoice_id == invoice_id)
+            recency = func.row_number().over(
+                partition_by=partition,
+                order_by=InvoiceItem.id.desc()
+            ).label('recency')
+            lines = db.query(InvoiceItem.id, InvoiceItem.invoice_id, InvoiceItem.description,
+                             InvoiceItem.unit_price, recency).join(Invoice).filter(
+                # Served by ix_invoices_parsed_vendor_number
+                Invoice.parsed_vendor_name == str(vendor_name)[:Invoice.parsed_vendor_name.type.length],
+                InvoiceItem.description.in_(descriptions),
+                InvoiceItem.unit_price.isnot(None)
+            ).subquery()
+            rows = db.query(lines.c.invoice_id, lines.c.description, lines.c.unit_price).filter(
+                lines.c.recency == 1
+            ).order_by(lines.c.id).all()
+        finally:
+            db.close()
+        
+        latest: Dict[str, _PriceEntry] = {}
+        others: Dict[str, float] = {}
+        for source_id, description, price in rows:  # Oldest first, so the newest line wins
+            latest[description] = (float(price), source_id)
+            if source_id != invoice_id:
+                others[description] = float(price)
+        return latest, others
     
-    def update_price_history(self, vendor_name: str, item_description: str, price: float):
-        """Update price history (for testing purposes)"""
-        key = f"{vendor_name}:{item_description}"
-        self.price_history[key] = {
-            'price': price,
-            'timestamp': datetime.utcnow()
-        }
+    def update_price_history(self, vendor_name: str, item_description: str, price: float,
+                             invoice_id: Optional[int] = None):
+        """Record an item's latest price (from invoice invoice_id), replacing any cached lookup"""
+        self.price_history.set((vendor_name, item_description), (float(price), invoice_id))
     
     def get_validation_stats(self) -> Dict[str, Any]:
         """Get validation statistics"""
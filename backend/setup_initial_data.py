@@ -3,37 +3,35 @@
 Setup initial data for BevScan testing
 """
 
-from app.database import SessionLocal
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.database import SessionLocal, engine
 from app.core.models.invoice import Vendor
-from datetime import datetime
+from modules.parsing.validators import price_validator
 
 def setup_initial_data():
     """Create initial data for testing"""
-    db = SessionLocal()
+    # Both dialects support INSERT ... ON CONFLICT, so the existence check and the
+    # insert are one statement instead of a SELECT round trip plus an INSERT
+    insert = sqlite_insert if engine.dialect.name == "sqlite" else postgresql_insert
+    create_vendor = insert(Vendor).values(
+        id=1,
+        name="Beverage Supply Co.",
+        email="sales@beveragesupply.com",
+        phone="(555) 123-4567"
+    ).on_conflict_do_nothing(index_elements=[Vendor.id])
     
     try:
-        # Check if default vendor exists
-        existing_vendor = db.query(Vendor).filter(Vendor.id == 1).first()
-        
-        if not existing_vendor:
-            # Create default vendor
-            default_vendor = Vendor(
-                id=1,
-                name="Beverage Supply Co.",
-                email="sales@beveragesupply.com",
-                phone="(555) 123-4567"
-            )
-            db.add(default_vendor)
-            db.commit()
-            print("✅ Default vendor created")
-        else:
-            print("✅ Default vendor already exists")
-            
+        # Commits on success and rolls back on error
+        with SessionLocal.begin() as db:
+            created = db.execute(create_vendor).rowcount
+        print("✅ Default vendor created" if created else "✅ Default vendor already exists")
     except Exception as e:
         print(f"❌ Error setting up initial data: {e}")
-        db.rollback()
-    finally:
-        db.close()
+    
+    # Compile validator kernels once so the first parsed invoice doesn't pay for it
+    price_validator.warm_up()
+    print("✅ Price validation kernels compiled")
 
 if __name__ == "__main__":
     setup_initial_data() 
\ No newline at end of file
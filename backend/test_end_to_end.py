@@ -3,33 +3,40 @@
 End-to-end test for BevScan pipeline
 """
 
-import requests
-import json
-import time
+import httpx
+import orjson
+import asyncio
 import os
-from pathlib import Path
+import sys
 
 # API base URL
 API_BASE = "http://localhost:8000"
 
-def test_health():
+# Sample invoice, resolved once
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE = os.path.join(BASE_DIR, "uploads", "sample_beverage_invoice.pdf")
+
+def _json(response: httpx.Response):
+    """Decode a JSON response body with orjson"""
+    return orjson.loads(response.content)
+
+async def test_health(client: httpx.AsyncClient):
     """Test API health"""
     print("🏥 Testing API health...")
-    response = requests.get(f"{API_BASE}/health")
+    response = await client.get("/health")
     if response.status_code == 200:
-        data = response.json()
+        data = _json(response)
         print(f"   ✅ API healthy: {data}")
         return True
     else:
         print(f"   ❌ API health check failed: {response.status_code}")
         return False
 
-def test_upload_invoice():
+async def test_upload_invoice(client: httpx.AsyncClient):
     """Test invoice upload"""
     print("\n📤 Testing invoice upload...")
     
-    # Path to sample invoice
-    invoice_path = os.path.join(os.path.dirname(__file__), "uploads/sample_beverage_invoice.pdf")
+    invoice_path = SAMPLE
     
     if not os.path.exists(invoice_path):
         print(f"   ❌ Sample invoice not found: {invoice_path}")
@@ -38,39 +45,49 @@ def test_upload_invoice():
     # Upload file
     with open(invoice_path, 'rb') as f:
         files = {'file': ('sample_beverage_invoice.pdf', f, 'application/pdf')}
-        response = requests.post(f"{API_BASE}/invoices/upload", files=files)
+        response = await client.post("/invoices/upload", files=files)
     
-    if response.status_code == 201:
-        data = response.json()
-        invoice_id = data['invoice_id']
+    # 201 for a new upload, 200 when identical content was uploaded before
+    if response.status_code in (200, 201):
+        data = _json(response)
+        invoice_id = data['id']
         print(f"   ✅ Invoice uploaded successfully: ID {invoice_id}")
         return invoice_id
     else:
         print(f"   ❌ Upload failed: {response.status_code} - {response.text}")
         return None
 
-def test_parse_invoice(invoice_id):
+async def test_parse_invoice(client: httpx.AsyncClient, invoice_id):
     """Test invoice parsing"""
     print(f"\n🔍 Testing invoice parsing for ID {invoice_id}...")
     
-    response = requests.post(f"{API_BASE}/invoices/{invoice_id}/parse")
+    response = await client.post(f"/invoices/{invoice_id}/parse")
     
-    if response.status_code == 200:
-        data = response.json()
-        print(f"   ✅ Invoice parsed successfully: {data}")
-        return True
-    else:
+    if response.status_code != 202:
         print(f"   ❌ Parsing failed: {response.status_code} - {response.text}")
         return False
+    
+    # Parsing runs in the background; poll until it finishes
+    for _ in range(60):
+        await asyncio.sleep(2)
+        data = _json(await client.get(f"/invoices/{invoice_id}/parse_status"))
+        if data['status'] == 'parsed':
+            print(f"   ✅ Invoice parsed successfully: {data}")
+            return True
+        if data['status'] == 'error':
+            break
+    
+    print(f"   ❌ Parsing failed: {data}")
+    return False
 
-def test_get_invoice(invoice_id):
+async def test_get_invoice(client: httpx.AsyncClient, invoice_id):
     """Test getting parsed invoice"""
     print(f"\n📋 Testing invoice retrieval for ID {invoice_id}...")
     
-    response = requests.get(f"{API_BASE}/invoices/{invoice_id}")
+    response = await client.get(f"/invoices/{invoice_id}")
     
     if response.status_code == 200:
-        data = response.json()
+        data = _json(response)
         print(f"   ✅ Invoice retrieved successfully")
         print(f"   📄 Invoice Number: {data.get('invoice_number', 'N/A')}")
         print(f"   📅 Status: {data.get('status', 'N/A')}")
@@ -85,56 +102,61 @@ def test_get_invoice(invoice_id):
         print(f"   ❌ Retrieval failed: {response.status_code} - {response.text}")
         return None
 
-def test_list_invoices():
+async def test_list_invoices(client: httpx.AsyncClient):
     """Test listing invoices"""
     print("\n📋 Testing invoice list...")
     
-    response = requests.get(f"{API_BASE}/invoices/")
+    response = await client.get("/invoices/")
     
     if response.status_code == 200:
-        invoices = response.json()
+        invoices = _json(response)
         print(f"   ✅ Found {len(invoices)} invoices")
-        for invoice in invoices:
-            print(f"      - ID {invoice['id']}: {invoice['invoice_number']} ({invoice['status']})")
+        # One write for the whole listing instead of a print per invoice
+        sys.stdout.write("".join(
+            f"      - ID {invoice['id']}: {invoice['invoice_number']} ({invoice['status']})\n"
+            for invoice in invoices
+        ))
         return invoices
     else:
         print(f"   ❌ List failed: {response.status_code} - {response.text}")
         return []
 
-def main():
+async def main():
     """Run complete end-to-end test"""
     print("🚀 Starting BevScan End-to-End Test")
     print("=" * 50)
     
+    # One keep-alive connection pool for every request in the run
+    async with httpx.AsyncClient(base_url=API_BASE, timeout=30) as client:
+        await run_tests(client)
+
+async def run_tests(client: httpx.AsyncClient):
+    """Run upload -> parse in order, stopping at the first failure, then the read-only checks together"""
     # Test 1: Health check
-    if not test_health():
+    if not await test_health(client):
         print("❌ Health check failed. Make sure the backend is running.")
         return
     
     # Test 2: Upload invoice
-    invoice_id = test_upload_invoice()
+    invoice_id = await test_upload_invoice(client)
     if not invoice_id:
         print("❌ Upload failed. Stopping test.")
         return
     
     # Test 3: Parse invoice
-    if not test_parse_invoice(invoice_id):
+    if not await test_parse_invoice(client, invoice_id):
         print("❌ Parsing failed. Stopping test.")
         return
     
-    # Wait a moment for processing
-    print("\n⏳ Waiting for processing to complete...")
-    time.sleep(3)
-    
-    # Test 4: Get parsed invoice
-    invoice_data = test_get_invoice(invoice_id)
+    # Tests 4-5: Get parsed invoice and list all invoices; independent, so in parallel
+    invoice_data, _ = await asyncio.gather(
+        test_get_invoice(client, invoice_id),
+        test_list_invoices(client)
+    )
     if not invoice_data:
         print("❌ Retrieval failed. Stopping test.")
         return
     
-    # Test 5: List all invoices
-    test_list_invoices()
-    
     print("\n" + "=" * 50)
     print("🎉 End-to-End Test Complete!")
     print(f"📊 Test Results:")
@@ -152,4 +174,4 @@ def main():
     print(f"📚 API Docs: http://localhost:8000/docs")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    asyncio.run(main()) 
\ No newline at end of file
@@ -5,18 +5,20 @@ Direct test of the parsing pipeline
 
 import asyncio
 import os
-from pathlib import Path
 from modules.parsing.pipeline import InvoiceParsingPipeline
 
+# Sample invoice, resolved once
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE = os.path.join(BASE_DIR, "uploads", "sample_beverage_invoice.pdf")
+
 async def test_pipeline():
     """Test the pipeline directly"""
     print("🚀 Testing Pipeline Directly")
     print("=" * 50)
     
-    # Get the sample invoice path
-    file_path = Path(__file__).parent / "uploads" / "sample_beverage_invoice.pdf"
+    file_path = SAMPLE
     
-    if not file_path.exists():
+    if not os.path.exists(file_path):
         print(f"❌ File not found: {file_path}")
         return
     
@@ -28,7 +30,7 @@ async def test_pipeline():
         
         # Parse the invoice
         print("🔍 Starting pipeline...")
-        result = await pipeline.parse_invoice(str(file_path))
+        result = await pipeline.parse_invoice(file_path)
         
         print("📊 Pipeline Result:")
         print(f"   Success: {result.get('success')}")
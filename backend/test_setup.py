@@ -7,12 +7,42 @@ Tests all components: OCR, LLM, Database, and basic functionality
 import os
 import sys
 import json
+import functools
+import importlib.util
+import orjson
 import requests
 from pathlib import Path
 
 # Add the backend directory to Python path
 sys.path.append(str(Path(__file__).parent))
 
+from modules.llm._json import extract_json_object
+
+# Extraction prompt for test_invoice_parsing with the schema minified once; only the
+# invoice text is appended per call
+PARSING_SCHEMA_JSON = json.dumps({
+    "vendor_name": "string",
+    "invoice_number": "string",
+    "invoice_date": "YYYY-MM-DD",
+    "items": [
+        {
+            "description": "string",
+            "quantity": "number",
+            "unit_price": "number",
+            "total": "number"
+        }
+    ],
+    "subtotal": "number",
+    "tax": "number",
+    "total": "number"
+}, separators=(',', ':'))
+PARSING_PROMPT_PREFIX = f"""
+Extract the following information from this invoice in JSON format:
+{PARSING_SCHEMA_JSON}
+
+Invoice text:
+"""
+
 def test_python_version():
     """Test Python version"""
     print("🐍 Testing Python version...")
@@ -45,11 +75,15 @@ def test_imports():
     failed_imports = []
     
     for name, module in imports.items():
+        # Only availability is checked, so locate each module without executing it
         try:
-            __import__(module)
+            found = importlib.util.find_spec(module) is not None
+        except ModuleNotFoundError:  # Parent package (e.g. google) is missing
+            found = False
+        if found:
             print(f"   ✅ {name}")
-        except ImportError as e:
-            print(f"   ❌ {name}: {e}")
+        else:
+            print(f"   ❌ {name}: No module named '{module}'")
             failed_imports.append(name)
     
     return len(failed_imports) == 0
@@ -64,14 +98,10 @@ def test_tesseract():
         
         # Create a simple test image with text
         img = Image.new('RGB', (200, 50), color='white')
-        img.save('test_image.png')
         
-        # Test OCR
-        text = pytesseract.image_to_string('test_image.png')
+        # Test OCR on the in-memory image; no temp file to write and clean up
+        text = pytesseract.image_to_string(img)
         print("   ✅ Tesseract is working")
-        
-        # Cleanup
-        os.remove('test_image.png')
         return True
     except Exception as e:
         print(f"   ❌ Tesseract error: {e}")
@@ -96,7 +126,7 @@ def test_ollama():
             )
             
             if response.status_code == 200:
-                result = response.json()
+                result = orjson.loads(response.content)
                 print(f"   ✅ {model}: {result['response'][:50]}...")
             else:
                 print(f"   ❌ {model}: HTTP {response.status_code}")
@@ -108,21 +138,23 @@ def test_ollama():
     
     return True
 
+@functools.lru_cache(maxsize=1)
+def _gemini_model():
+    """Configure the Gemini SDK and build the model on first use only"""
+    import google.generativeai as genai
+    
+    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+    return genai.GenerativeModel('gemini-1.5-flash')
+
 def test_gemini():
     """Test Google Gemini API"""
     print("\n🔑 Testing Google Gemini API...")
     try:
-        import google.generativeai as genai
-        
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
+        if not os.getenv('GEMINI_API_KEY'):
             print("   ⚠️  GEMINI_API_KEY not found in environment")
             return False
         
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        response = model.generate_content("Extract vendor name from: Invoice from ABC Beverages")
+        response = _gemini_model().generate_content("Extract vendor name from: Invoice from ABC Beverages")
         print(f"   ✅ Gemini: {response.text[:50]}...")
         return True
         
@@ -184,53 +216,23 @@ def test_invoice_parsing():
             "http://localhost:11434/api/generate",
             json={
                 "model": "llama3.2",
-                "prompt": f"""
-                Extract the following information from this invoice in JSON format:
-                {{
-                    "vendor_name": "string",
-                    "invoice_number": "string",
-                    "invoice_date": "YYYY-MM-DD",
-                    "items": [
-                        {{
-                            "description": "string",
-                            "quantity": "number",
-                            "unit_price": "number",
-                            "total": "number"
-                        }}
-                    ],
-                    "subtotal": "number",
-                    "tax": "number",
-                    "total": "number"
-                }}
-                
-                Invoice text:
-                {sample_invoice}
-                """,
+                "prompt": PARSING_PROMPT_PREFIX + sample_invoice,
                 "stream": False
             },
             timeout=120
         )
         
         if response.status_code == 200:
-            result = response.json()
+            result = orjson.loads(response.content)
             print(f"   ✅ LLM extraction successful: {result['response'][:100]}...")
             
-            # Try to parse JSON
+            # Try to parse JSON: the first balanced object that decodes, so braces in
+            # surrounding prose don't break the match (same helper the LLM clients use)
             try:
-                # Find JSON in response
-                response_text = result['response']
-                start_idx = response_text.find('{')
-                end_idx = response_text.rfind('}') + 1
-                
-                if start_idx != -1 and end_idx != 0:
-                    json_str = response_text[start_idx:end_idx]
-                    parsed_data = json.loads(json_str)
-                    print(f"   ✅ JSON parsing successful: {parsed_data.get('vendor_name', 'N/A')}")
-                else:
-                    print("   ⚠️  JSON not found in response")
-                    
-            except json.JSONDecodeError as e:
-                print(f"   ⚠️  JSON parsing failed: {e}")
+                parsed_data = extract_json_object(result['response'])
+                print(f"   ✅ JSON parsing successful: {parsed_data.get('vendor_name', 'N/A')}")
+            except ValueError:
+                print("   ⚠️  JSON not found in response")
             
             return True
         else:
@@ -2,11 +2,11 @@
 
 import { useState, useEffect } from 'react';
 import { FileText, Eye, AlertTriangle, CheckCircle, Clock, RefreshCw } from 'lucide-react';
-import { Invoice, invoiceApi } from '@/lib/api';
+import { Invoice, InvoiceSummary, invoiceApi } from '@/lib/api';
 import InvoiceDisplay from './InvoiceDisplay';
 
 export default function Dashboard() {
-  const [invoices, setInvoices] = useState<Invoice[]>([]);
+  const [invoices, setInvoices] = useState<InvoiceSummary[]>([]);
   const [selectedInvoice, setSelectedInvoice] = useState<Invoice | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
@@ -166,8 +166,6 @@ export default function Dashboard() {
                     setSelectedInvoice(freshInvoice);
                   } catch (error) {
                     console.error('Error fetching invoice details:', error);
-                    // Fallback to the invoice from the list
-                    setSelectedInvoice(invoice);
                   }
                 }}
               >
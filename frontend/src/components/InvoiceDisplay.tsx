@@ -9,6 +9,9 @@ interface InvoiceDisplayProps {
   onRefresh: () => void;
 }
 
+const POLL_INTERVAL = 2000; // 2 seconds
+const POLL_TIMEOUT = 60 * 1000; // 1 minute
+
 export default function InvoiceDisplay({ invoice, onRefresh }: InvoiceDisplayProps) {
   const [isParsing, setIsParsing] = useState(false);
 
@@ -16,6 +19,13 @@ export default function InvoiceDisplay({ invoice, onRefresh }: InvoiceDisplayPro
     setIsParsing(true);
     try {
       await invoiceApi.parse(invoice.id);
+      // Parsing runs in the background; wait until it leaves 'processing'
+      const start = Date.now();
+      while (Date.now() - start < POLL_TIMEOUT) {
+        await new Promise(res => setTimeout(res, POLL_INTERVAL));
+        const { status } = await invoiceApi.parseStatus(invoice.id);
+        if (status !== 'processing') break;
+      }
       onRefresh();
     } catch (error) {
       console.error('Parse error:', error);
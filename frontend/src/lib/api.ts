@@ -30,6 +30,18 @@ export interface Invoice {
   alerts?: Alert[];
 }
 
+// Row returned by the invoice listing (no raw_text/parsed_data)
+export interface InvoiceSummary {
+  id: number;
+  vendor_id: number;
+  invoice_number: string;
+  invoice_date: string | null;
+  total: number | null;
+  status: string;
+  created_at: string;
+  vendor?: Pick<Vendor, 'id' | 'name'>;
+}
+
 export interface Vendor {
   id: number;
   name: string;
@@ -78,32 +90,38 @@ export const invoiceApi = {
     return response.data;
   },
 
-  // Parse invoice
-  parse: async (invoiceId: number): Promise<{ message: string; invoice_id: number }> => {
+  // Queue invoice parsing (runs in the background; poll parseStatus)
+  parse: async (invoiceId: number): Promise<{ message: string; invoice_id: number; status: string }> => {
     const response = await api.post(`/invoices/${invoiceId}/parse`);
     return response.data;
   },
 
+  // Get parse status
+  parseStatus: async (invoiceId: number): Promise<{ invoice_id: number; status: string; confidence_score: number | null }> => {
+    const response = await api.get(`/invoices/${invoiceId}/parse_status`);
+    return response.data;
+  },
+
   // Get invoice details
   get: async (invoiceId: number): Promise<Invoice> => {
     const response = await api.get(`/invoices/${invoiceId}`);
     return response.data;
   },
 
-  // List invoices
-  list: async (skip = 0, limit = 100): Promise<Invoice[]> => {
+  // List invoices (newest first); pass the X-Next-Cursor header as afterId for the next page
+  list: async (afterId?: number, limit = 100): Promise<InvoiceSummary[]> => {
     const response = await api.get('/invoices/', {
-      params: { skip, limit },
+      params: { after_id: afterId, limit },
     });
     return response.data;
   },
 };
 
 export const alertApi = {
-  // List all alerts
-  list: async (skip = 0, limit = 100): Promise<Alert[]> => {
+  // List alerts (newest first); pass the X-Next-Cursor header as afterId for the next page
+  list: async (afterId?: number, limit = 100): Promise<Alert[]> => {
     const response = await api.get('/alerts/', {
-      params: { skip, limit },
+      params: { after_id: afterId, limit },
     });
     return response.data;
   },